@@ -5,13 +5,41 @@ A modular Python application for face detection, video processing,
 and image filtering.
 """
 
+import time
+
+# When the package was first imported, as the start of time-to-first-frame
+IMPORT_TIME = time.perf_counter()
+
 __version__ = '0.1.0'
 
-from jarvis.core.app import Jarvis
 
-def main():
+def __getattr__(name):
+    # Submodules are imported on first use, so that e.g. importing
+    # jarvis.utils.filters doesn't load the whole application (or Qt)
+    if name == 'Jarvis':
+        from jarvis.core.app import Jarvis
+        return Jarvis
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def main(argv=None):
     """Run the Jarvis application."""
+    import argparse
     import logging
+    parser = argparse.ArgumentParser(description='Jarvis computer vision application')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run without a window (and without Qt); control it '
+                             'through the local control endpoint instead')
+    parser.add_argument('--fps', type=float, default=None,
+                        help='Most frames per second to process (default: the '
+                             'display refresh rate, or 30 when headless)')
+    parser.add_argument('--control-port', type=int, default=None,
+                        help='Port of the local control endpoint (default: '
+                             '8765 when headless, disabled otherwise)')
+    args = parser.parse_args(argv)
+
     logging.basicConfig(level=logging.DEBUG)
-    app = Jarvis()
+    from jarvis.core.app import Jarvis
+    app = Jarvis(max_fps=args.fps, headless=args.headless,
+                 control_port=args.control_port)
     app.run()
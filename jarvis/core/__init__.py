@@ -1,2 +1,9 @@
 """Core application modules."""
-from jarvis.core.app import Jarvis
+
+
+def __getattr__(name):
+    # Imported on first use, so importing jarvis.core.control stays cheap
+    if name == 'Jarvis':
+        from jarvis.core.app import Jarvis
+        return Jarvis
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,39 +2,123 @@
 
 
 import logging
+import time
 from threading import Thread
 
-import cv2
-
+import jarvis
 from jarvis.utils import filters
+from jarvis.utils import metrics
+from jarvis.utils.profiler import StackSampler
 from jarvis.utils import rects
-from jarvis.ui.display import PyQtWindowManager
+from jarvis.utils import tracing
+from jarvis.utils.annotations import AnnotationRasterizer, annotate_faces
+from jarvis.utils.tiling import TileExecutor
+from jarvis.ui.headless import HeadlessWindowManager
+from jarvis.core.control import ControlServer
 from jarvis.face.detector import FaceDetector
+from jarvis.video.frame_pool import FramePool
 from jarvis.video.streams import DummyStream, WebcamVideoStream, ThreadedWebStream
 from jarvis.video.recorder import VideoRecorder
 from jarvis.face.base import Face
+from jarvis.face.anonymizer import FaceAnonymizer
+
 
+FRAMES_PROCESSED = metrics.counter('jarvis_frames_processed_total',
+                                   "Camera frames run through the pipeline")
+TRACKED_FACES = metrics.gauge('jarvis_tracked_faces', "Faces currently being tracked")
 
 class Jarvis(object):
-    def __init__(self):
+    # Control endpoint port used by headless mode unless one is given
+    DEFAULT_CONTROL_PORT = 8765
+    # How many seconds of pipeline spans a trace dump covers
+    TRACE_SECONDS = 10
+    # How long the profiler runs unless it's stopped sooner
+    PROFILE_SECONDS = 30
+    # Frames pixelated whole after face tracking is lost, in case the
+    # faces are still there but no longer detected
+    FULL_ANONYMIZE_FRAMES = 30
+
+    def __init__(self, max_fps=None, headless=False, control_port=None):
+        """
+        Initialize the application.
+
+        Args:
+            max_fps: Most frames per second to process and show (defaults to
+                the display's refresh rate, or 30 when headless)
+            headless: Run without a window, and without importing Qt
+            control_port: Port for the local control endpoint (defaults to
+                DEFAULT_CONTROL_PORT when headless, and none otherwise)
+        """
+        self.max_fps = max_fps
+        self.headless = headless
+        self._last_frame_sequence = None
+        self._next_track_id = 0
+        self._shown_first_frame = False
         self._should_draw_debug = False
-        self.raw_camera_stream = WebcamVideoStream(should_mirror=True)
-        self.raw_web_stream = ThreadedWebStream(self.raw_camera_stream, port=8000)
-        self.processed_camera_stream = DummyStream()
-        self.processed_web_stream = ThreadedWebStream(self.processed_camera_stream, port=8888)
+        # Full-size frames are leased from one pool and reused, rather than
+        # allocated for every captured, mirrored and processed frame
+        self.frame_pool = FramePool()
+        self.raw_camera_stream = WebcamVideoStream(should_mirror=True,
+                                                   frame_pool=self.frame_pool)
+        self.raw_web_stream = ThreadedWebStream(self.raw_camera_stream, port=8000,
+                                                name='raw')
+        self.processed_camera_stream = DummyStream(self.frame_pool)
+        self.processed_web_stream = ThreadedWebStream(self.processed_camera_stream, port=8888,
+                                                      name='processed')
+        # Processed frames are only produced while something consumes them
+        self.processed_camera_stream.add_consumer(
+            lambda: self.processed_web_stream.subscriber_count > 0)
+        self.processed_camera_stream.add_consumer(self._is_showing_filtered_view)
         self.face_detector = FaceDetector()
-        self.window_manager = PyQtWindowManager('Jarvis - Computer Vision', self.on_key_press)
-        self.window_manager.filterChanged.connect(self.on_filter_changed)
-        self.window_manager.showFilteredChanged.connect(self.on_show_filtered_changed)
+        if headless:
+            self.window_manager = HeadlessWindowManager(self.on_key_press)
+        else:
+            from jarvis.ui.display import PyQtWindowManager
+            self.window_manager = PyQtWindowManager('Jarvis - Computer Vision', self.on_key_press)
+            self.window_manager.filterChanged.connect(self.on_filter_changed)
+            self.window_manager.showFilteredChanged.connect(self.on_show_filtered_changed)
+        if control_port is None and headless:
+            control_port = self.DEFAULT_CONTROL_PORT
+        self.control_server = None
+        if control_port:
+            self.control_server = ControlServer(self.on_key_press, self.on_filter_changed,
+                                                self.get_state, port=control_port)
         self.video_recorder = VideoRecorder(self.raw_camera_stream)
+        # Faces are pixelated on the processed stream unless toggled off
+        self.face_anonymizer = FaceAnonymizer()
+        self._should_anonymize = True
+        self._frames_to_fully_anonymize = 0
+        self._annotation_rasterizer = AnnotationRasterizer()
+        # Samples every thread's stack while profiling is toggled on
+        self.profiler = StackSampler()
         
         # Initialize filters
         self.current_filter = None
         self.filter_intensity = 50
         self.show_filtered_view = False
         self._initialize_filters()
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Expose the frame pool's counters on the web streams' /metrics."""
+        pool = self.frame_pool
+        metrics.counter('jarvis_frame_pool_leases_total',
+                        "Buffers leased from the frame pool").set_function(lambda: pool.leases)
+        metrics.counter('jarvis_frame_pool_hits_total',
+                        "Leases served by a retired buffer").set_function(lambda: pool.hits)
+        metrics.counter('jarvis_frame_pool_allocations_total',
+                        "Buffers the frame pool had to allocate").set_function(
+                            lambda: pool.allocations)
+        metrics.counter('jarvis_frame_pool_allocated_bytes_total',
+                        "Bytes the frame pool allocated").set_function(
+                            lambda: pool.allocated_bytes)
+        metrics.gauge('jarvis_frame_pool_free_buffers',
+                      "Retired buffers waiting to be reused").set_function(
+                          lambda: pool.stats()['free'])
 
     def start(self):
+        # Load the face detection model while everything else comes up
+        self.face_detector.warm_up()
         logging.info('Starting raw camera stream')
         self.raw_camera_stream.start()
         logging.info("Starting raw web stream {}".format(
@@ -47,232 +131,294 @@ class Jarvis(object):
         self.processed_web_stream.start()
         logging.info('Starting video recorder')
         self.video_recorder.start()
+        if self.control_server is not None:
+            logging.info("Starting control server {}".format(self.control_server))
+            self.control_server.start()
 
     def run(self):
-        """Run the main loop."""
+        """Run the application until the window is closed.
+
+        Qt's event loop drives the UI; a timer polls the camera stream at up
+        to max_fps (the display's refresh rate by default) and processes a
+        frame only when the stream has a new one. Headless, a plain loop
+        polls at the same rate until told to quit.
+        """
         try:
             self.start()
             self.window_manager.create_window()
-            while self.window_manager.is_window_created:
-                frame = self.raw_camera_stream.read()
-                #frame = self.capture_manager.frame
-                if frame is not None:
-                    # Initialize frame skip counters if needed
-                    if not hasattr(self, '_detection_interval'):
-                        self._detection_interval = 0  # Counter for detection frequency
-                        self._detection_frame_skip = 0  # Number of frames to skip
-                    
-                    # Adaptive frame skipping for face detection
-                    # Once we have faces, we can skip more frames to smooth performance
-                    if hasattr(self, '_smoothed_faces') and self._smoothed_faces is not None:
-                        max_skip = 2  # Skip at most 2 frames when we have faces
-                    else:
-                        max_skip = 0  # Don't skip frames when searching for faces
-                    
-                    # Update face detection on some frames, not every frame
-                    if self._detection_interval >= self._detection_frame_skip:
-                        self.face_detector.update(frame)
-                        current_faces = self.face_detector.faces
-                        
-                        # Reset counter and set next skip amount
-                        self._detection_interval = 0
-                        
-                        # Adaptively set frame skip based on detection results
-                        if current_faces and len(current_faces) > 0:
-                            # We found faces, can skip more frames
-                            self._detection_frame_skip = max_skip
-                        else:
-                            # No faces found, reduce skipping to find them faster
-                            self._detection_frame_skip = 0
-                    else:
-                        # Skip face detection this frame, use previous results
-                        self._detection_interval += 1
-                        
-                        # Use last known detection results
-                        if hasattr(self, '_last_faces'):
-                            current_faces = self._last_faces
-                        else:
-                            current_faces = []
-                    
-                    # Store current faces for skipped frames
-                    self._last_faces = current_faces
-                    
-                    # Initialize history for temporal smoothing if needed
-                    if not hasattr(self, '_face_history'):
-                        self._face_history = []
-                        self._smoothed_faces = None
-                        self._frame_count = 0
-                        self._previous_face_count = 0
-                        self._stable_count = 0  # Count frames with stable detection
-                    
-                    # Initialize tracking variables
-                    if not hasattr(self, '_frames_since_detection'):
-                        self._frames_since_detection = 0
-                        self._expected_face_count = 1  # Usually expect 1 face
-                        self._face_count_confidence = 0
-                        
-                    # Get the current number of faces
-                    current_face_count = len(current_faces) if current_faces is not None else 0
-                        
-                    # Track frames with no detection or unexpected count
-                    if current_face_count == 0:
-                        self._frames_since_detection += 1
-                    elif current_face_count != self._expected_face_count:
-                        # When we detect an unexpected number (like 2), 
-                        # don't immediately trust it
-                        if self._face_count_confidence < 5:
-                            self._face_count_confidence += 1
-                        else:
-                            # After seeing the same count for 5+ frames, accept it
-                            self._expected_face_count = current_face_count
-                            self._face_count_confidence = 0
-                            self._frames_since_detection = 0
-                    else:
-                        # We see the expected number of faces
-                        self._frames_since_detection = 0
-                        self._face_count_confidence = 0
-                    
-                    # Filter the detected faces based on our confidence
-                    filtered_faces = None
-                    if current_face_count > 0:
-                        if current_face_count == self._expected_face_count or self._face_count_confidence >= 5:
-                            # Accept the faces if they match expectations or we've seen this count consistently
-                            filtered_faces = current_faces
-                        elif current_face_count > self._expected_face_count and self._expected_face_count == 1:
-                            # If we're detecting extra faces (but expect 1),
-                            # just take the largest face as it's likely the correct one
-                            if current_faces and len(current_faces) > 0:
-                                # Find the face with largest area
-                                largest_face = max(current_faces, key=lambda face: 
-                                                 (face.face_rect[2] * face.face_rect[3]) 
-                                                 if face.face_rect is not None else 0)
-                                filtered_faces = [largest_face]
-                    
-                    # Keep most recent reliable detection if we're only missing for a few frames
-                    if self._frames_since_detection > 0 and self._frames_since_detection <= 15:
-                        # Don't update face history for brief disappearances
-                        pass
-                    else:
-                        # Update history with filtered faces
-                        self._face_history.append(filtered_faces)
-                        if len(self._face_history) > 10:  # Use a reasonable history window
-                            self._face_history.pop(0)
-                    
-                    # Apply temporal smoothing to reduce jitter
-                    # If we have filtered faces in this frame, apply smoothing
-                    if filtered_faces is not None:
-                        # If this is our first face detection, just use it directly
-                        if self._smoothed_faces is None:
-                            self._smoothed_faces = filtered_faces
-                            # Initialize a history of face rectangles for each face
-                            self._rect_history = [[] for _ in range(len(filtered_faces))]
-                        else:
-                            # We already have smoothed faces, update them
-                            for i, face in enumerate(filtered_faces):
-                                if i < len(self._smoothed_faces):
-                                    # Apply smoothing only to the face rectangle
-                                    if face.face_rect is not None and self._smoothed_faces[i].face_rect is not None:
-                                        x, y, w, h = face.face_rect
-                                        
-                                        # Update rectangle history for this face
-                                        if i >= len(self._rect_history):
-                                            self._rect_history.append([])
-                                        self._rect_history[i].append(face.face_rect)
-                                        if len(self._rect_history[i]) > 8:  # Keep last 8 frames
-                                            self._rect_history[i].pop(0)
-                                        
-                                        # Calculate smooth rectangle by averaging recent positions
-                                        if len(self._rect_history[i]) >= 3:
-                                            # Get average of recent rectangles
-                                            avg_x = sum(rect[0] for rect in self._rect_history[i]) / len(self._rect_history[i])
-                                            avg_y = sum(rect[1] for rect in self._rect_history[i]) / len(self._rect_history[i])
-                                            avg_w = sum(rect[2] for rect in self._rect_history[i]) / len(self._rect_history[i])
-                                            avg_h = sum(rect[3] for rect in self._rect_history[i]) / len(self._rect_history[i])
-                                            
-                                            # Create smoothed rectangle
-                                            smoothed_rect = (int(avg_x), int(avg_y), int(avg_w), int(avg_h))
-                                            
-                                            # Apply smooth rectangle
-                                            self._smoothed_faces[i].face_rect = smoothed_rect
-                                        else:
-                                            # Not enough history yet, just use current detection
-                                            self._smoothed_faces[i].face_rect = face.face_rect
-                                        
-                                        # Copy other facial features (eyes, nose, mouth)
-                                        self._smoothed_faces[i].left_eye_rect = face.left_eye_rect
-                                        self._smoothed_faces[i].right_eye_rect = face.right_eye_rect
-                                        self._smoothed_faces[i].nose_rect = face.nose_rect
-                                        self._smoothed_faces[i].mouth_rect = face.mouth_rect
-                                else:
-                                    # We have a new face, add it
-                                    self._smoothed_faces.append(face)
-                                    if i >= len(self._rect_history):
-                                        self._rect_history.append([])
-                                    self._rect_history[i].append(face.face_rect)
-                    
-                    # Otherwise if we've only temporarily lost detection, keep using previous detection
-                    elif self._frames_since_detection <= 15 and self._smoothed_faces is not None:
-                        # Keep using the last detected faces for a brief period
-                        pass  # _smoothed_faces stays the same
-                    
-                    # We've lost detection for too long, clear tracking
-                    else:
-                        self._smoothed_faces = None
-                        self._rect_history = []
-                    
-                    # Get the stable face count
-                    stable_face_count = len(self._smoothed_faces) if self._smoothed_faces is not None else 0
-                    
-                    # Increment frame counter
-                    self._frame_count += 1
-                    
-                    # Log only when face count changes (after smoothing)
-                    if stable_face_count != self._previous_face_count:
-                        # Only log changes that persist for at least 3 frames
-                        self._stable_count += 1
-                        if self._stable_count >= 3:
-                            if stable_face_count > self._previous_face_count:
-                                logging.info(f"Frame {self._frame_count}: Detected {stable_face_count} face(s)")
+            self.window_manager.run(self._on_frame_timer, self.max_fps)
+        finally:
+            self.stop()
+
+    def _on_frame_timer(self):
+        """Process the newest camera frame, if it hasn't been processed yet."""
+        if self.control_server is not None:
+            self.control_server.run_pending()
+        sequence, frame = self.raw_camera_stream.read_new(self._last_frame_sequence)
+        if frame is None:
+            return
+        self._last_frame_sequence = sequence
+        try:
+            self.process_frame(frame)
+        finally:
+            self.raw_camera_stream.release(frame)
+
+    def process_frame(self, frame):
+        """Detect and track faces in a camera frame, then publish and show it."""
+        # Initialize frame skip counters if needed
+        if not hasattr(self, '_detection_interval'):
+            self._detection_interval = 0  # Counter for detection frequency
+            self._detection_frame_skip = 0  # Number of frames to skip
+        
+        # Adaptive frame skipping for face detection
+        # Once we have faces, we can skip more frames to smooth performance
+        if hasattr(self, '_smoothed_faces') and self._smoothed_faces is not None:
+            max_skip = 2  # Skip at most 2 frames when we have faces
+        else:
+            max_skip = 0  # Don't skip frames when searching for faces
+        
+        # Update face detection on some frames, not every frame
+        if self._detection_interval >= self._detection_frame_skip:
+            self.face_detector.update(frame)
+            current_faces = self.face_detector.faces
+            
+            # Reset counter and set next skip amount
+            self._detection_interval = 0
+            
+            # Adaptively set frame skip based on detection results
+            if current_faces and len(current_faces) > 0:
+                # We found faces, can skip more frames
+                self._detection_frame_skip = max_skip
+            else:
+                # No faces found, reduce skipping to find them faster
+                self._detection_frame_skip = 0
+        else:
+            # Skip face detection this frame, use previous results
+            self._detection_interval += 1
+            
+            # Use last known detection results
+            if hasattr(self, '_last_faces'):
+                current_faces = self._last_faces
+            else:
+                current_faces = []
+        
+        # Store current faces for skipped frames
+        self._last_faces = current_faces
+        track_start = time.perf_counter()
+        
+        # Initialize history for temporal smoothing if needed
+        if not hasattr(self, '_face_history'):
+            self._face_history = []
+            self._smoothed_faces = None
+            self._frame_count = 0
+            self._previous_face_count = 0
+            self._stable_count = 0  # Count frames with stable detection
+        
+        # Initialize tracking variables
+        if not hasattr(self, '_frames_since_detection'):
+            self._frames_since_detection = 0
+            self._expected_face_count = 1  # Usually expect 1 face
+            self._face_count_confidence = 0
+            
+        # Get the current number of faces
+        current_face_count = len(current_faces) if current_faces is not None else 0
+            
+        # Track frames with no detection or unexpected count
+        if current_face_count == 0:
+            self._frames_since_detection += 1
+        elif current_face_count != self._expected_face_count:
+            # When we detect an unexpected number (like 2), 
+            # don't immediately trust it
+            if self._face_count_confidence < 5:
+                self._face_count_confidence += 1
+            else:
+                # After seeing the same count for 5+ frames, accept it
+                self._expected_face_count = current_face_count
+                self._face_count_confidence = 0
+                self._frames_since_detection = 0
+        else:
+            # We see the expected number of faces
+            self._frames_since_detection = 0
+            self._face_count_confidence = 0
+        
+        # Filter the detected faces based on our confidence
+        filtered_faces = None
+        if current_face_count > 0:
+            if current_face_count == self._expected_face_count or self._face_count_confidence >= 5:
+                # Accept the faces if they match expectations or we've seen this count consistently
+                filtered_faces = current_faces
+            elif current_face_count > self._expected_face_count and self._expected_face_count == 1:
+                # If we're detecting extra faces (but expect 1),
+                # just take the largest face as it's likely the correct one
+                if current_faces and len(current_faces) > 0:
+                    # Find the face with largest area
+                    largest_face = max(current_faces, key=lambda face: 
+                                     (face.face_rect[2] * face.face_rect[3]) 
+                                     if face.face_rect is not None else 0)
+                    filtered_faces = [largest_face]
+        
+        # Keep most recent reliable detection if we're only missing for a few frames
+        if self._frames_since_detection > 0 and self._frames_since_detection <= 15:
+            # Don't update face history for brief disappearances
+            pass
+        else:
+            # Update history with filtered faces
+            self._face_history.append(filtered_faces)
+            if len(self._face_history) > 10:  # Use a reasonable history window
+                self._face_history.pop(0)
+        
+        # Apply temporal smoothing to reduce jitter
+        # If we have filtered faces in this frame, apply smoothing
+        if filtered_faces is not None:
+            # If this is our first face detection, just use it directly
+            if self._smoothed_faces is None:
+                self._smoothed_faces = filtered_faces
+                for face in self._smoothed_faces:
+                    face.track_id = self._new_track_id()
+                # Initialize a history of face rectangles for each face
+                self._rect_history = [[] for _ in range(len(filtered_faces))]
+            else:
+                # We already have smoothed faces, update them
+                for i, face in enumerate(filtered_faces):
+                    if i < len(self._smoothed_faces):
+                        # Apply smoothing only to the face rectangle
+                        if face.face_rect is not None and self._smoothed_faces[i].face_rect is not None:
+                            x, y, w, h = face.face_rect
+                            
+                            # Update rectangle history for this face
+                            if i >= len(self._rect_history):
+                                self._rect_history.append([])
+                            self._rect_history[i].append(face.face_rect)
+                            if len(self._rect_history[i]) > 8:  # Keep last 8 frames
+                                self._rect_history[i].pop(0)
+                            
+                            # Calculate smooth rectangle by averaging recent positions
+                            if len(self._rect_history[i]) >= 3:
+                                # Get average of recent rectangles
+                                avg_x = sum(rect[0] for rect in self._rect_history[i]) / len(self._rect_history[i])
+                                avg_y = sum(rect[1] for rect in self._rect_history[i]) / len(self._rect_history[i])
+                                avg_w = sum(rect[2] for rect in self._rect_history[i]) / len(self._rect_history[i])
+                                avg_h = sum(rect[3] for rect in self._rect_history[i]) / len(self._rect_history[i])
+                                
+                                # Create smoothed rectangle
+                                smoothed_rect = (int(avg_x), int(avg_y), int(avg_w), int(avg_h))
+                                
+                                # Apply smooth rectangle
+                                self._smoothed_faces[i].face_rect = smoothed_rect
                             else:
-                                logging.info(f"Frame {self._frame_count}: Lost face detection - now {stable_face_count} face(s)")
-                            self._previous_face_count = stable_face_count
-                            self._stable_count = 0
+                                # Not enough history yet, just use current detection
+                                self._smoothed_faces[i].face_rect = face.face_rect
+                            
+                            # Copy other facial features (eyes, nose, mouth)
+                            self._smoothed_faces[i].left_eye_rect = face.left_eye_rect
+                            self._smoothed_faces[i].right_eye_rect = face.right_eye_rect
+                            self._smoothed_faces[i].nose_rect = face.nose_rect
+                            self._smoothed_faces[i].mouth_rect = face.mouth_rect
                     else:
-                        self._stable_count = 0
-                    
-                    # Pass the smoothed face data to the VideoDisplay widget
-                    self.window_manager.video_display.set_faces(self._smoothed_faces)
-                    
-                    # Update the debug state in the UI
-                    self.window_manager.video_display.set_debug_mode(self._should_draw_debug)
-                    
-                    # Create a copy of the frame for processing
-                    processed_frame = frame.copy()
-                    
-                    # Apply filter to the processed frame if needed
-                    if self.current_filter and self.current_filter != 'none':
-                        # Apply the selected filter
-                        self.apply_filter(processed_frame, processed_frame)
-                    
-                    # Apply face detection annotations to the processed frame
-                    self._draw_face_annotations(processed_frame)
-                    
-                    # Update the processed stream with the processed frame
-                    self.processed_camera_stream.frame = processed_frame
-                    
-                    # Decide which frame to show in the UI
-                    if self.show_filtered_view and self.current_filter and self.current_filter != 'none':
-                        # Show the filtered frame in the UI
-                        display_frame = self.processed_camera_stream.frame
+                        # We have a new face, add it
+                        face.track_id = self._new_track_id()
+                        self._smoothed_faces.append(face)
+                        if i >= len(self._rect_history):
+                            self._rect_history.append([])
+                        self._rect_history[i].append(face.face_rect)
+        
+        # Otherwise if we've only temporarily lost detection, keep using previous detection
+        elif self._frames_since_detection <= 15 and self._smoothed_faces is not None:
+            # Keep using the last detected faces for a brief period
+            pass  # _smoothed_faces stays the same
+        
+        # We've lost detection for too long, clear tracking
+        else:
+            if self._smoothed_faces is not None:
+                self._frames_to_fully_anonymize = self.FULL_ANONYMIZE_FRAMES
+            self._smoothed_faces = None
+            self._rect_history = []
+        
+        if self._frames_to_fully_anonymize > 0:
+            self._frames_to_fully_anonymize -= 1
+        
+        # Get the stable face count
+        stable_face_count = len(self._smoothed_faces) if self._smoothed_faces is not None else 0
+        
+        # Increment frame counter
+        self._frame_count += 1
+        
+        # Log only when face count changes (after smoothing)
+        if stable_face_count != self._previous_face_count:
+            # Only log changes that persist for at least 3 frames
+            self._stable_count += 1
+            if self._stable_count >= 3:
+                if stable_face_count > self._previous_face_count:
+                    logging.info(f"Frame {self._frame_count}: Detected {stable_face_count} face(s)")
+                else:
+                    logging.info(f"Frame {self._frame_count}: Lost face detection - now {stable_face_count} face(s)")
+                self._previous_face_count = stable_face_count
+                self._stable_count = 0
+        else:
+            self._stable_count = 0
+        metrics.record_stage('track', track_start, time.perf_counter(),
+                             getattr(frame, 'capture_time', None))
+        FRAMES_PROCESSED.inc()
+        TRACKED_FACES.set(stable_face_count)
+        
+        # Describe the debug overlay once; each output renders it
+        annotations = None
+        if self._should_draw_debug and self._smoothed_faces:
+            with metrics.stage('annotate', frame):
+                annotations = annotate_faces(self._smoothed_faces, frame.shape)
+        
+        # Only filter and annotate if the processed frame will
+        # be seen, by the UI or a client of the processed stream
+        if self.processed_camera_stream.has_consumers:
+            # A pooled buffer that isn't still published (web clients
+            # may be encoding the previous frame)
+            processed_frame = self.frame_pool.lease_like(frame)
+            if self._is_filter_active():
+                self.apply_filter(frame, processed_frame)
+            else:
+                processed_frame[:] = frame
+            
+            # Pixelate the tracked faces (only their rectangles), or the
+            # whole frame while no detection can be trusted: the detector
+            # is still loading, or tracking was only just lost
+            if self._should_anonymize:
+                with metrics.stage('anonymize', processed_frame):
+                    if not self.face_detector.is_ready or self._frames_to_fully_anonymize > 0:
+                        self.face_anonymizer.pixelate_frame(processed_frame)
                     else:
-                        # Show the raw frame in the UI
-                        display_frame = frame
-                        
-                    # Send the selected frame to the UI for display
-                    self.window_manager.show_frame(display_frame)
-                self.window_manager.process_events()
-        finally:
-            self.stop()
+                        self.face_anonymizer.apply(processed_frame, self._smoothed_faces)
+            
+            # Burn the face detection annotations into the processed frame
+            if annotations:
+                with metrics.stage('annotate', processed_frame):
+                    self._annotation_rasterizer.draw(annotations, processed_frame)
+            
+            # Update the processed stream with the processed frame; the
+            # stream keeps its own reference until the next one replaces it
+            self.processed_camera_stream.frame = processed_frame
+            self.frame_pool.release(processed_frame)
+        
+        # Decide which frame to show in the UI
+        if self._is_showing_filtered_view():
+            # Show the filtered frame in the UI, which already
+            # has the annotations burned in
+            display_frame = self.processed_camera_stream.frame
+            self.window_manager.video_display.set_annotations(None)
+        else:
+            # Show the raw frame in the UI, with the annotations
+            # painted over it
+            display_frame = frame
+            self.window_manager.video_display.set_annotations(annotations)
+            
+        # Send the selected frame to the UI for display
+        with metrics.stage('render', display_frame):
+            self.window_manager.show_frame(display_frame)
+        metrics.observe_frame_age('display', getattr(display_frame, 'capture_time', None))
+        
+        if not self._shown_first_frame:
+            self._shown_first_frame = True
+            logging.info("Time to first frame: {:.2f}s since importing jarvis".format(
+                time.perf_counter() - jarvis.IMPORT_TIME))
 
     def stop(self):
         # Stop web streaming from the raw camera feed
@@ -292,75 +438,135 @@ class Jarvis(object):
         # Stop the dummy feed of processed frames
         logging.info('Stopping processed camera stream')
         self.processed_camera_stream.stop()
+        self._tile_executor.close()
+        if self.profiler.is_running:
+            self.profiler.stop()
+        if self.control_server is not None:
+            logging.info('Stopping control server')
+            self.control_server.stop()
+
+    def _new_track_id(self):
+        """Return a new identifier for a face that has started being tracked."""
+        self._next_track_id += 1
+        return self._next_track_id
 
     def screenshot(self):
         self.video_recorder.capture_screenshot('screenshot.png')
 
+    def dump_trace(self):
+        """Write the last TRACE_SECONDS of pipeline spans to a Chrome trace file.
+
+        The file (e.g. trace-20240131-120000.json) is written next to the
+        screenshots, on a background thread; open it in chrome://tracing or
+        https://ui.perfetto.dev.
+        """
+        path = time.strftime('trace-%Y%m%d-%H%M%S.json')
+
+        def dump():
+            count = tracing.SPANS.dump(path, self.TRACE_SECONDS)
+            logging.info(f"Trace of {count} spans saved to {path}")
+
+        Thread(target=dump, name='trace-dump', daemon=True).start()
+
+    def toggle_profiler(self):
+        """Start or stop sampling the stacks of every thread.
+
+        Sampling stops by itself after PROFILE_SECONDS. The collapsed stacks
+        (e.g. profile-20240131-120000.folded) are written next to the
+        screenshots; view them with speedscope or flamegraph.pl.
+        """
+        if self.profiler.is_running:
+            logging.info("Stopping the profiler")
+            self.profiler.stop(wait=False)
+        else:
+            path = time.strftime('profile-%Y%m%d-%H%M%S.folded')
+            logging.info(f"Profiling for up to {self.PROFILE_SECONDS}s into {path}")
+            self.profiler.start(path, self.PROFILE_SECONDS)
+
     def toggle_record_video(self):
         if not self.video_recorder.is_writing_video:
             self.video_recorder.start_recording('screencast.avi')
         else:
             self.video_recorder.stop_recording()
 
+    def toggle_anonymize(self):
+        """Toggle pixelation of faces on the processed stream."""
+        self._should_anonymize = not self._should_anonymize
+        logging.info(f"Face anonymization {'on' if self._should_anonymize else 'off'}")
+
     def toggle_show_detection(self):
         """Toggle debug display and update UI state."""
         self._should_draw_debug = not self._should_draw_debug
         # Sync the UI state with our internal state
-        self.window_manager.video_display.set_debug_mode(self._should_draw_debug)
-        
-        # Block signals to prevent recursive callbacks
-        self.window_manager.detection_action.blockSignals(True)
-        self.window_manager.show_detection_cb.blockSignals(True)
-        
-        # Ensure the toolbar button and checkbox match our state
-        self.window_manager.detection_action.setChecked(self._should_draw_debug)
-        self.window_manager.show_detection_cb.setChecked(self._should_draw_debug)
-        
-        # Re-enable signals
-        self.window_manager.detection_action.blockSignals(False)
-        self.window_manager.show_detection_cb.blockSignals(False)
+        self.window_manager.set_show_detection(self._should_draw_debug)
+
+    def get_state(self):
+        """Return a summary of the application's state, for the control endpoint."""
+        return {
+            'headless': self.headless,
+            'filter': self.current_filter or 'none',
+            'intensity': self.filter_intensity,
+            'show_detection': self._should_draw_debug,
+            'anonymize': self._should_anonymize,
+            'recording': self.video_recorder.is_writing_video,
+            'profiling': self.profiler.is_running,
+            'processed_subscribers': self.processed_web_stream.subscriber_count,
+            'frame_pool': self.frame_pool.stats(),
+        }
 
     def _initialize_filters(self):
         """Initialize the image filters."""
         # Create filter instances
-        self.filters = {
-            'none': None,
-            'edges': filters.FindEdgesFilter(),
-            'sharpen': filters.SharpenFilter(),
-            'blur': filters.BlurFilter(),
-            'emboss': filters.EmbossFilter(),
-            'cross_process': filters.BGRCrossProcessCurveFilter(),
-            'portra': filters.BGRPortraCurveFilter(),
-            'provia': filters.BGRProviaCurveFilter(),
-            'velvia': filters.BGRVelviaCurveFilter()
-        }
+        self.filters = filters.create_default_filters()
+        # Intensity variants are built on first use and kept in a small LRU
+        self._filter_variants = filters.FilterVariantCache(self._get_filter)
+        # Frames of 1080 rows or more are filtered in parallel strips
+        self._tile_executor = TileExecutor()
     
+    def set_filter_chain(self, filter_ids):
+        """Select a stack of filters, applied in order (e.g. portra, sharpen, emboss)."""
+        self.current_filter = '+'.join(filter_ids)
+
+    def _get_filter(self, filter_id):
+        """Return the filter for an ID, building chains like 'portra+sharpen'.
+
+        Chains are not added to self.filters (the built-in filters): the
+        variants built from them are kept in the bounded _filter_variants
+        LRU instead.
+        """
+        if not filter_id:
+            return None
+        if filter_id not in self.filters and '+' in filter_id:
+            steps = []
+            for step_id in filter_id.split('+'):
+                if step_id in self.filters:
+                    steps.append(self.filters[step_id])
+                else:
+                    logging.warning(f"Unknown filter in chain: {step_id}")
+                    return None
+            # Adjacent curves and convolutions are fused when the chain is built
+            return filters.FilterPipeline(steps)
+        return self.filters.get(filter_id)
+
+    def _is_filter_active(self):
+        return bool(self.current_filter) and self.current_filter != 'none'
+
+    def _is_showing_filtered_view(self):
+        """Whether the UI is showing the processed (filtered) frames."""
+        return self.show_filtered_view and self._is_filter_active()
+
     def apply_filter(self, src, dst):
-        """Apply the currently selected filter to the frame."""
-        if not self.current_filter or self.current_filter == 'none' or self.current_filter not in self.filters:
+        """Apply the currently selected filter (or filter chain) to the frame."""
+        # The variant for the current intensity has the intensity baked in
+        filter_obj = self._filter_variants.get(self.current_filter, self.filter_intensity)
+        if filter_obj is None:
             # No filtering needed, just copy
             if src is not dst:
                 dst[:] = src
             return
-        
-        filter_obj = self.filters[self.current_filter]
-        
-        # Special case for edges - use stroke_edges function instead of FindEdgesFilter
-        if self.current_filter == 'edges':
-            # For edge detection, we can adjust parameters based on intensity
-            blur_size = max(3, 3 + (self.filter_intensity // 10) * 2)  # Odd values 3-13
-            edge_size = max(3, 3 + (self.filter_intensity // 20) * 2)  # Odd values 3-7
-            
-            # Ensure odd values
-            if blur_size % 2 == 0:
-                blur_size += 1
-            if edge_size % 2 == 0:
-                edge_size += 1
-                
-            filters.stroke_edges(src, dst, blur_size, edge_size)
-        else:
-            # Apply the filter - convolution or curve filter
-            filter_obj.apply(src, dst)
+
+        with metrics.stage('filter', src):
+            self._tile_executor.apply(filter_obj, src, dst)
             
     def on_filter_changed(self, filter_id, intensity):
         """Handle filter change from UI."""
@@ -373,61 +579,15 @@ class Jarvis(object):
         logging.info(f"Show filtered view changed to {show_filtered}")
         self.show_filtered_view = show_filtered
         
-    def _draw_face_annotations(self, frame):
-        """Draw face detection annotations on the given frame."""
-        if not self._should_draw_debug or not hasattr(self, '_smoothed_faces') or not self._smoothed_faces:
-            return
-            
-        # Import colours here to avoid circular imports
-        from jarvis.utils import colours
-        
-        # Draw debug overlay
-        for face in self._smoothed_faces:
-            # Draw face rectangle with a more refined thickness
-            if face.face_rect is not None:
-                x, y, w, h = face.face_rect
-                cv2.rectangle(frame, (x, y), (x+w, y+h), colours.FACE_COLOUR, 3)
-            
-            # Draw eye rectangles with more subtle thickness
-            if face.left_eye_rect is not None:
-                x, y, w, h = face.left_eye_rect
-                cv2.rectangle(frame, (x, y), (x+w, y+h), colours.LEFT_EYE_COLOUR, 2)
-                
-            if face.right_eye_rect is not None:
-                x, y, w, h = face.right_eye_rect
-                cv2.rectangle(frame, (x, y), (x+w, y+h), colours.RIGHT_EYE_COLOUR, 2)
-            
-            # Draw nose and mouth rectangles with refined thickness
-            if face.nose_rect is not None:
-                x, y, w, h = face.nose_rect
-                cv2.rectangle(frame, (x, y), (x+w, y+h), colours.NOSE_COLOUR, 2)
-                
-            if face.mouth_rect is not None:
-                x, y, w, h = face.mouth_rect
-                cv2.rectangle(frame, (x, y), (x+w, y+h), colours.MOUTH_COLOUR, 2)
-        
-        # Draw text for number of faces
-        h, w = frame.shape[:2]
-        found = f"Faces: {len(self._smoothed_faces)}"
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        x_pos = int(w * 0.05)
-        y_pos = int(h * 0.1)
-        
-        # Create a background box for better text readability
-        text_size = cv2.getTextSize(found, font, 1.2, 2)[0]
-        box_coords = ((x_pos-10, y_pos+10), (x_pos + text_size[0]+10, y_pos - text_size[1]-10))
-        cv2.rectangle(frame, box_coords[0], box_coords[1], (0, 0, 0), -1)  # Filled black background
-        
-        # Draw text with improved readability
-        cv2.putText(frame, found, (x_pos, y_pos), font, 1.2, colours.TEXT_OUTLINE_COLOUR, 4, cv2.LINE_AA)
-        cv2.putText(frame, found, (x_pos, y_pos), font, 1.2, colours.HIGHLIGHT_TEXT_COLOUR, 2, cv2.LINE_AA)
-    
     def on_key_press(self, keycode):
         """Handle a key press.
 
         space  -> Take a screenshot.
         tab    -> Start/stop recording a screencast.
         x      -> Start/stop drawing debug data.
+        a      -> Start/stop pixelating faces on the processed stream.
+        t      -> Save a trace of the last few seconds of the pipeline.
+        p      -> Start/stop profiling every thread.
         escape -> Quit.
         """
         if keycode == 32: # space
@@ -436,10 +596,16 @@ class Jarvis(object):
             self.toggle_record_video()
         elif keycode == 120: # x
             self.toggle_show_detection()
+        elif keycode == 97: # a
+            self.toggle_anonymize()
+        elif keycode == 116: # t
+            self.dump_trace()
+        elif keycode == 112: # p
+            self.toggle_profiler()
         elif keycode == 27: # escape
             self.window_manager.destroy_window()
 
 
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG)
-    Jarvis().run()
\ No newline at end of file
+    from jarvis import main
+    main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+A small local HTTP endpoint for controlling a running Jarvis.
+
+Without a window there are no keyboard shortcuts, so the same actions are
+exposed over HTTP, e.g.:
+
+    curl -X POST http://127.0.0.1:8765/actions/screenshot
+    curl -X POST 'http://127.0.0.1:8765/filter?id=portra&intensity=60'
+    curl http://127.0.0.1:8765/
+
+Requests are only queued by the server thread; the application runs them
+on its own thread when it next calls ControlServer.run_pending().
+"""
+
+import json
+import logging
+import queue
+from threading import Thread
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Actions and the keys that trigger them in the window
+ACTIONS = {
+    'screenshot': 32,  # space
+    'record': 9,  # tab
+    'detection': 120,  # x
+    'anonymize': 97,  # a
+    'trace': 116,  # t
+    'profile': 112,  # p
+    'quit': 27,  # escape
+}
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if urlparse(self.path).path != '/':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        self._send_json(200, {
+            'actions': sorted(self.server.actions),
+            'state': self.server.get_state() if self.server.get_state else {},
+        })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'actions' and parts[1] in self.server.actions:
+            self.server.pending.put(('key', self.server.actions[parts[1]]))
+            self._send_json(202, {'queued': parts[1]})
+        elif parts == ['filter']:
+            query = parse_qs(url.query)
+            filter_id = query.get('id', ['none'])[0]
+            try:
+                intensity = int(query.get('intensity', ['50'])[0])
+            except ValueError:
+                self._send_json(400, {'error': 'intensity must be an integer'})
+                return
+            self.server.pending.put(('filter', (filter_id, intensity)))
+            self._send_json(202, {'queued': 'filter', 'id': filter_id,
+                                  'intensity': intensity})
+        else:
+            self._send_json(404, {'error': 'Unknown action',
+                                  'actions': sorted(self.server.actions)})
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug("Control: " + format, *args)
+
+
+class ControlServer(Thread):
+    """Serves the control endpoint on a local port, on its own thread."""
+
+    def __init__(self, on_key_press, on_filter_changed, get_state=None,
+                 ip='127.0.0.1', port=8765):
+        """
+        Initialize the server.
+
+        Args:
+            on_key_press: Called with an action's key code
+            on_filter_changed: Called with (filter_id, intensity)
+            get_state: Optional callable returning a JSON-serialisable dict
+            ip: Address to listen on (keep it local: there is no authentication)
+            port: Port to listen on
+        """
+        super(ControlServer, self).__init__(name='control-server')
+        self.daemon = True
+        self.ip = ip
+        self.port = port
+        self._on_key_press = on_key_press
+        self._on_filter_changed = on_filter_changed
+        self.server = HTTPServer((ip, port), ControlRequestHandler)
+        self.server.actions = dict(ACTIONS)
+        self.server.get_state = get_state
+        self.server.pending = queue.Queue()
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_pending(self):
+        """Run every queued request, on the calling thread."""
+        while True:
+            try:
+                kind, argument = self.server.pending.get_nowait()
+            except queue.Empty:
+                return
+            if kind == 'key':
+                self._on_key_press(argument)
+            else:
+                self._on_filter_changed(*argument)
+
+    def __str__(self):
+        return "{}:{}".format(self.ip, self.port)
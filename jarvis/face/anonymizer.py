@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""
+Face anonymization for outbound video.
+"""
+
+import cv2
+import numpy as np
+from jarvis.utils import rects
+
+
+class FaceAnonymizer:
+    """
+    Pixelates faces in a frame, in place.
+
+    Only the face rectangles (grown by a margin, to cover hair and ears) are
+    touched: each is shrunk to one pixel per block and scaled back up into
+    the frame, so the cost grows with the area of the faces, not the frame.
+    """
+
+    def __init__(self, block_size=16, margin=0.15):
+        """
+        Initialize the anonymizer.
+
+        Args:
+            block_size: Width and height of each pixelation block, in pixels
+            margin: Fraction of the face size to add around each face
+        """
+        self.block_size = block_size
+        self.margin = margin
+        self._small_buffer = None
+
+    def apply(self, frame, faces):
+        """
+        Pixelate every face in a frame.
+
+        Args:
+            frame: BGR image, modified in place
+            faces: List of Face objects (those without face_rect are skipped)
+        """
+        for face in faces or []:
+            if face.face_rect is not None:
+                self.pixelate(frame, face.face_rect)
+
+    def pixelate_frame(self, frame):
+        """Pixelate the whole frame, in place."""
+        height, width = frame.shape[:2]
+        self.pixelate(frame, (0, 0, width, height))
+
+    def pixelate(self, frame, rect):
+        """Pixelate one (x, y, w, h) region of a frame, in place."""
+        x, y, w, h = rect
+        margin_x, margin_y = int(w * self.margin), int(h * self.margin)
+        rect = rects.clip_rect(
+            (x - margin_x, y - margin_y, w + 2 * margin_x, h + 2 * margin_y), frame)
+        if rect is None:
+            return
+        x, y, w, h = rect
+        roi = frame[y:y+h, x:x+w]
+        small_size = (max(w // self.block_size, 1), max(h // self.block_size, 1))
+        small = self._small_buffer
+        if small is None or small.shape[:2] != small_size[::-1] \
+                or small.shape[2:] != roi.shape[2:]:
+            small = np.empty(small_size[::-1] + roi.shape[2:], dtype=roi.dtype)
+            self._small_buffer = small
+        cv2.resize(roi, small_size, small, interpolation=cv2.INTER_AREA)
+        cv2.resize(small, (w, h), roi, interpolation=cv2.INTER_NEAREST)
@@ -12,6 +12,8 @@ class Face:
         self.right_eye_rect = None
         self.nose_rect = None
         self.mouth_rect = None
+        # Stable identifier assigned by whoever tracks the face across frames
+        self.track_id = None
 
 class BaseFaceDetector:
     """Base class for all face detectors."""
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+On-disk cache of detected face crops used when training recognizers.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+from jarvis.utils import helpers as utils
+
+
+class FaceCropCache:
+    """
+    Caches the face crop detected in each training image.
+
+    Entries are keyed by a namespace (identifying the detector that found
+    the crop, see detector_namespace()) and the image's absolute path, and
+    are only valid while the file's size and modification time are
+    unchanged. Images in which no face was found are cached too, so they
+    are not re-detected either.
+    """
+
+    INDEX_FILE = 'index.json'
+    # Bumped when the index layout changes; older indexes are discarded
+    INDEX_VERSION = 2
+
+    def __init__(self, cache_dir=None):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory for the cache (defaults to the Jarvis cache dir)
+        """
+        if cache_dir is None:
+            cache_dir = utils.get_cache_dir('face_crops')
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, self.INDEX_FILE)
+        self._index = self._read_index()
+        self._entries = self._index['namespaces']
+        self._is_dirty = False
+
+    @staticmethod
+    def image_key(image_path):
+        """
+        Return the cache key for an image file.
+
+        Returns:
+            Tuple of (absolute_path, size, mtime_ns)
+        """
+        stat = os.stat(image_path)
+        return os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def detector_namespace(detector):
+        """
+        Return a namespace identifying a detector and its settings, so crops
+        found by one detector aren't reused for another.
+        """
+        cls = type(detector)
+        settings = sorted(
+            (name, value) for name, value in vars(detector).items()
+            if not name.startswith('_')
+            and isinstance(value, (bool, int, float, str, tuple)))
+        return f"{cls.__module__}.{cls.__qualname__}{settings}"
+
+    def get(self, image_path, namespace=''):
+        """
+        Look up the cached crop for an image.
+
+        Args:
+            image_path: Path to the source image
+            namespace: Namespace the crop was stored under
+
+        Returns:
+            Tuple of (hit, crop); crop is None if no face was found in the image
+        """
+        path, size, mtime_ns = self.image_key(image_path)
+        entry = self._entries.get(namespace, {}).get(path)
+        if entry is None or entry['size'] != size or entry['mtime_ns'] != mtime_ns:
+            return False, None
+        if entry['crop'] is None:
+            return True, None
+        try:
+            return True, np.load(os.path.join(self.cache_dir, entry['crop']))
+        except (OSError, ValueError):
+            # The crop file is missing or corrupt; treat it as a miss
+            return False, None
+
+    def put(self, image_path, crop, namespace=''):
+        """
+        Store the crop detected in an image.
+
+        Args:
+            image_path: Path to the source image
+            crop: Grayscale face crop, or None if no face was found
+            namespace: Namespace to store the crop under
+        """
+        path, size, mtime_ns = self.image_key(image_path)
+        crop_file = None
+        if crop is not None:
+            crop_name = namespace + '\0' + path
+            crop_file = hashlib.sha1(crop_name.encode('utf-8')).hexdigest() + '.npy'
+            np.save(os.path.join(self.cache_dir, crop_file), crop)
+        self._entries.setdefault(namespace, {})[path] = {
+            'size': size, 'mtime_ns': mtime_ns, 'crop': crop_file}
+        self._is_dirty = True
+
+    def save(self):
+        """Write the cache index to disk if it has changed."""
+        if not self._is_dirty:
+            return
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as index_file:
+            json.dump(self._index, index_file)
+        os.replace(tmp_path, self._index_path)
+        self._is_dirty = False
+
+    def _read_index(self):
+        """Read the cache index, starting afresh if it is missing, corrupt or outdated."""
+        try:
+            with open(self._index_path) as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            index = None
+        if not isinstance(index, dict) or index.get('version') != self.INDEX_VERSION:
+            index = {'version': self.INDEX_VERSION, 'namespaces': {}}
+        return index
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 
 
+import threading
+import time
+
 import cv2
+from jarvis.utils import metrics
 from jarvis.utils import rects
 from jarvis.utils import helpers as utils
 from jarvis.utils import colours
 from jarvis.face.base import Face
+from jarvis.face import resources
 from jarvis.face.dnn_detector import DNNFaceDetector
 from jarvis.face.haar_detector import HaarFaceDetector
 
@@ -18,34 +23,47 @@ class FaceDetector:
         self.min_neighbours = min_neighbours
         self._faces = []
         
-        # Initialize face detectors
-        try:
-            # Create DNN detector with lower confidence threshold for better detection
-            self._dnn_detector = DNNFaceDetector(min_confidence=0.5)
-            self._use_dnn = True
-            print("Using DNN face detector for improved accuracy")
-        except Exception as e:
-            print(f"Could not initialize DNN face detector: {e}")
-            print("Falling back to Haar cascade detectors")
-            self._use_dnn = False
-        
-        # Get the correct path to cascade files
-        import os
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        cascade_dir = os.path.join(base_dir, 'cascades')
-        
-        # Keep Haar cascade detectors as fallback
-        self._face_classifier_alt = cv2.CascadeClassifier(
-            os.path.join(cascade_dir, 'haarcascade_frontalface_alt.xml'))
-        self._face_classifier_default = cv2.CascadeClassifier(
-            os.path.join(cascade_dir, 'haarcascade_frontalface_default.xml'))
-        
-        self._eye_classifier = cv2.CascadeClassifier(
-            os.path.join(cascade_dir, 'haarcascade_eye.xml'))
-        self._nose_classifier = cv2.CascadeClassifier(
-            os.path.join(cascade_dir, 'haarcascade_mcs_nose.xml'))
-        self._mouth_classifier = cv2.CascadeClassifier(
-            os.path.join(cascade_dir, 'haarcascade_mcs_mouth.xml'))
+        # The DNN detector and the Haar cascades (kept as a fallback, and
+        # for facial features) are loaded on first use, from the shared
+        # cache in jarvis.face.resources
+        self._dnn_detector = None
+        self._use_dnn = None
+        self._dnn_lock = threading.Lock()
+        self._warm_up_thread = None
+        self._gray = None
+
+    def warm_up(self):
+        """Load the DNN detector and run a first inference in the background.
+
+        Until it finishes, update() finds no faces rather than stall the
+        frame that would otherwise pay for loading the model.
+        """
+        if self._use_dnn is None and self._warm_up_thread is None:
+            self._warm_up_thread = threading.Thread(
+                target=self._get_dnn_detector, name='dnn-warm-up', daemon=True)
+            self._warm_up_thread.start()
+
+    def _get_dnn_detector(self):
+        """Return the DNN detector, or None if it isn't available."""
+        with self._dnn_lock:
+            if self._use_dnn is None:
+                try:
+                    # Create DNN detector with lower confidence threshold for better detection
+                    dnn_detector = DNNFaceDetector(min_confidence=0.5)
+                    dnn_detector.warm_up()
+                    self._dnn_detector = dnn_detector
+                    self._use_dnn = True
+                    print("Using DNN face detector for improved accuracy")
+                except Exception as e:
+                    print(f"Could not initialize DNN face detector: {e}")
+                    print("Falling back to Haar cascade detectors")
+                    self._use_dnn = False
+        return self._dnn_detector if self._use_dnn else None
+
+    @property
+    def is_ready(self):
+        """False while warm_up() is still loading the detector (and update() finds nothing)."""
+        return self._warm_up_thread is None or not self._warm_up_thread.is_alive()
 
     @property
     def faces(self):
@@ -58,7 +76,8 @@ class FaceDetector:
         min_size = utils.width_height_divided_by(gray_image, 8)
         
         # Use extremely strict parameters to avoid false positives with glasses
-        face_rects_default = self._face_classifier_default.detectMultiScale(
+        face_rects_default = resources.get_cascade(
+            'haarcascade_frontalface_default.xml').detectMultiScale(
             gray_image,
             scaleFactor=1.1,
             minNeighbors=10,  # Very high to avoid false positives
@@ -66,7 +85,8 @@ class FaceDetector:
         )
         
         # Use similarly strict parameters with the alt classifier
-        face_rects_alt = self._face_classifier_alt.detectMultiScale(
+        face_rects_alt = resources.get_cascade(
+            'haarcascade_frontalface_alt.xml').detectMultiScale(
             gray_image,
             scaleFactor=1.1,
             minNeighbors=8,  # Very high
@@ -121,6 +141,10 @@ class FaceDetector:
     def update(self, image):
         """Update the tracked facial features."""
         self._faces = []
+        if not self.is_ready:
+            return
+
+        detect_start = time.perf_counter()
 
         # Prepare the image for detection
         if utils.is_gray(image):
@@ -129,13 +153,16 @@ class FaceDetector:
             colour_image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
         else:
             colour_image = image  # Keep original for DNN
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            # Converted into the last frame's buffer (OpenCV reallocates
+            # it if the frame size changed)
+            gray = self._gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, self._gray)
             cv2.equalizeHist(gray, gray)
 
         # Try DNN detector first if available (more accurate)
-        if hasattr(self, '_use_dnn') and self._use_dnn:
+        dnn_detector = self._get_dnn_detector()
+        if dnn_detector is not None:
             try:
-                face_rects = self._dnn_detector.detect_faces(colour_image)
+                face_rects = dnn_detector.detect_faces(colour_image)
                 # If no faces found with DNN, fall back to Haar cascades
                 if len(face_rects) == 0:
                     face_rects = self._detect_faces_with_haar(gray)
@@ -145,9 +172,15 @@ class FaceDetector:
         else:
             # Use Haar cascade detection if DNN not available
             face_rects = self._detect_faces_with_haar(gray)
+        features_start = time.perf_counter()
+        capture_time = getattr(image, 'capture_time', None)
+        metrics.record_stage('detect', detect_start, features_start, capture_time)
 
         # Process detected faces
         if len(face_rects) > 0:
+            eye_classifier = resources.get_cascade('haarcascade_eye.xml')
+            nose_classifier = resources.get_cascade('haarcascade_mcs_nose.xml')
+            mouth_classifier = resources.get_cascade('haarcascade_mcs_mouth.xml')
             for face_rect in face_rects:
                 face = Face()
                 face.face_rect = face_rect
@@ -157,24 +190,26 @@ class FaceDetector:
                 # Seek an eye in the upper-left part of the face.
                 search_rect = (x+int(w/7), y, int(w*2/7), int(h/2))
                 face.left_eye_rect = self._detect_one_object(
-                    self._eye_classifier, gray, search_rect, 64)
+                    eye_classifier, gray, search_rect, 64)
 
                 # Seek an eye in the upper-right part of the face.
                 search_rect = (x+int(w*4/7), y, int(w*2/7), int(h/2))
                 face.right_eye_rect = self._detect_one_object(
-                    self._eye_classifier, gray, search_rect, 64)
+                    eye_classifier, gray, search_rect, 64)
 
                 # Seek a nose in the middle part of the face.
                 search_rect = (x+int(w/4), y+int(h/4), int(w/2), int(h/2))
                 face.nose_rect = self._detect_one_object(
-                    self._nose_classifier, gray, search_rect, 32)
+                    nose_classifier, gray, search_rect, 32)
 
                 # Seek a mouth in the lower-middle part of the face.
                 search_rect = (x+int(w/6), y+int(h*2/3), int(w*2/3), int(h/3))
                 face.mouth_rect = self._detect_one_object(
-                    self._mouth_classifier, gray, search_rect, 16)
+                    mouth_classifier, gray, search_rect, 16)
 
                 self._faces.append(face)
+            metrics.record_stage('features', features_start, time.perf_counter(),
+                                 capture_time)
 
     def _detect_one_object(
             self, classifier, image, rect, image_size_to_min_size_ratio):
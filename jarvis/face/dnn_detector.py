@@ -2,8 +2,8 @@
 
 import cv2
 import numpy as np
-import os
 from .base import BaseFaceDetector
+from . import models
 
 class DNNFaceDetector(BaseFaceDetector):
     """
@@ -22,43 +22,19 @@ class DNNFaceDetector(BaseFaceDetector):
         super().__init__(**kwargs)
         self.min_confidence = min_confidence
         
-        # Get the base directory of the project
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        models_dir = os.path.join(base_dir, "models")
-        
-        # Check if we have the required model files
-        model_file = os.path.join(models_dir, "opencv_face_detector_uint8.pb")
-        config_file = os.path.join(models_dir, "opencv_face_detector.pbtxt")
-        
-        if not os.path.exists(models_dir):
-            os.makedirs(models_dir)
-        
-        # Download model files if they don't exist
-        if not os.path.exists(model_file) or not os.path.exists(config_file):
-            print("Downloading DNN face detection model...")
-            self._download_model_files(model_file, config_file)
-            
-        # Load the DNN face detector
-        self.detector = cv2.dnn.readNetFromTensorflow(model_file, config_file)
+        # The net is shared process-wide; model files are only looked up
+        # locally (see jarvis.face.models), never downloaded here
+        self._shared_net = models.load_net(
+            'opencv_face_detector', cv2.dnn.readNetFromTensorflow)
     
-    def _download_model_files(self, model_file, config_file):
-        """Download the required model files if they don't exist"""
-        import urllib.request
-        
-        # Ensure models directory exists
-        os.makedirs(os.path.dirname(model_file), exist_ok=True)
-        
-        # URLs for the model files - updated to working links
-        model_url = "https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20180220_uint8/opencv_face_detector_uint8.pb"
-        config_url = "https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/opencv_face_detector.pbtxt"
-        
-        print(f"Downloading model file from {model_url}")
-        urllib.request.urlretrieve(model_url, model_file)
-        
-        print(f"Downloading config file from {config_url}")
-        urllib.request.urlretrieve(config_url, config_file)
-        
-        print("Download complete!")
+    @property
+    def detector(self):
+        """The underlying cv2.dnn_Net (shared; hold its lock to run it)."""
+        return self._shared_net.net
+    
+    def warm_up(self):
+        """Run one inference on a blank image, so the first real one is fast."""
+        self.detect_faces(np.zeros((300, 300, 3), np.uint8))
     
     def detect_faces(self, image):
         """
@@ -79,11 +55,10 @@ class DNNFaceDetector(BaseFaceDetector):
             [104, 117, 123], False, False
         )
         
-        # Set the input to the detector
-        self.detector.setInput(blob)
-        
-        # Perform inference
-        detections = self.detector.forward()
+        # Set the input and perform inference, holding the shared net's lock
+        with self._shared_net.lock:
+            self.detector.setInput(blob)
+            detections = self.detector.forward()
         
         # Initialize the list of face rectangles
         face_rects = []
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+
+"""
+Face recognition using fixed-length face embeddings and a vectorized
+nearest-neighbour gallery.
+"""
+
+import json
+import os
+import cv2
+import numpy as np
+from jarvis.utils import rects
+from .haar_detector import HaarFaceDetector
+from .identity_cache import IdentityCache
+from . import models
+from . import resources
+from .preprocessing import FacePreprocessor
+
+
+class GalleryIndex:
+    """
+    A gallery of L2-normalised face embeddings stored as one contiguous
+    float32 matrix, searched with a single matrix multiply.
+
+    Large galleries can be memory-mapped from disk (see load()) and searched
+    in shards of a fixed number of rows to bound the working set.
+    """
+
+    def __init__(self, dimension, shard_rows=None):
+        """
+        Initialize an empty gallery.
+
+        Args:
+            dimension: Length of each embedding
+            shard_rows: If set, search the gallery in blocks of this many rows
+        """
+        self.dimension = dimension
+        self.shard_rows = shard_rows
+        self._embeddings = np.empty((0, dimension), dtype=np.float32)
+        self._labels = np.empty(0, dtype=np.int32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def embeddings(self):
+        """The (N, dimension) matrix of normalised embeddings."""
+        return self._embeddings[:self._size]
+
+    @property
+    def labels(self):
+        """The (N,) array of labels, one per embedding."""
+        return self._labels[:self._size]
+
+    def add(self, embeddings, labels):
+        """
+        Add embeddings to the gallery.
+
+        Args:
+            embeddings: Array of shape (n, dimension) or (dimension,)
+            labels: A label or sequence of n labels
+        """
+        embeddings = normalize_embeddings(embeddings)
+        labels = np.atleast_1d(np.asarray(labels, dtype=np.int32))
+        count = len(embeddings)
+        if count != len(labels):
+            raise ValueError("Expected one label per embedding")
+
+        required = self._size + count
+        if (required > len(self._embeddings)
+                or not self._embeddings.flags.writeable):
+            # Grow geometrically so repeated adds stay amortised O(1); this
+            # also copies a read-only memory-mapped gallery into memory
+            capacity = max(required, 2 * len(self._embeddings), 64)
+            embeddings_buffer = np.empty((capacity, self.dimension), dtype=np.float32)
+            labels_buffer = np.empty(capacity, dtype=np.int32)
+            embeddings_buffer[:self._size] = self.embeddings
+            labels_buffer[:self._size] = self.labels
+            self._embeddings = embeddings_buffer
+            self._labels = labels_buffer
+
+        self._embeddings[self._size:required] = embeddings
+        self._labels[self._size:required] = labels
+        self._size = required
+
+    def search(self, queries, k=1):
+        """
+        Find the k most similar gallery entries for each query.
+
+        Args:
+            queries: Array of shape (q, dimension) or (dimension,)
+            k: Number of neighbours to return per query
+
+        Returns:
+            Tuple of (labels, scores), each of shape (q, k), ordered by
+            descending cosine similarity
+        """
+        queries = normalize_embeddings(queries)
+        k = min(k, self._size)
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int32), empty.astype(np.float32)
+
+        shard_rows = self.shard_rows or self._size
+        best_rows = None
+        best_scores = None
+        for start in range(0, self._size, shard_rows):
+            stop = min(start + shard_rows, self._size)
+            scores = queries @ self._embeddings[start:stop].T
+            rows = _top_k(scores, k)
+            scores = np.take_along_axis(scores, rows, axis=1)
+            rows += start
+            if best_rows is None:
+                best_rows, best_scores = rows, scores
+            else:
+                # Merge this shard's candidates with the best so far
+                rows = np.concatenate((best_rows, rows), axis=1)
+                scores = np.concatenate((best_scores, scores), axis=1)
+                keep = _top_k(scores, k)
+                best_rows = np.take_along_axis(rows, keep, axis=1)
+                best_scores = np.take_along_axis(scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return self._labels[best_rows], best_scores
+
+    def save(self, path_prefix):
+        """
+        Save the gallery as two .npy files that can be memory-mapped.
+
+        Args:
+            path_prefix: Prefix for '<prefix>.embeddings.npy' and '<prefix>.labels.npy'
+        """
+        np.save(path_prefix + '.embeddings.npy', self.embeddings)
+        np.save(path_prefix + '.labels.npy', self.labels)
+
+    @classmethod
+    def load(cls, path_prefix, mmap=False, shard_rows=None):
+        """
+        Load a gallery written by save().
+
+        Args:
+            path_prefix: Prefix the gallery was saved with
+            mmap: Whether to memory-map the embeddings instead of reading them
+            shard_rows: If set, search the gallery in blocks of this many rows
+
+        Returns:
+            A GalleryIndex
+        """
+        mmap_mode = 'r' if mmap else None
+        embeddings = np.load(path_prefix + '.embeddings.npy', mmap_mode=mmap_mode)
+        labels = np.load(path_prefix + '.labels.npy')
+        gallery = cls(embeddings.shape[1], shard_rows=shard_rows)
+        gallery._embeddings = embeddings
+        gallery._labels = labels.astype(np.int32, copy=False)
+        gallery._size = len(labels)
+        return gallery
+
+
+def normalize_embeddings(embeddings):
+    """Return embeddings as a 2D float32 array with unit-length rows."""
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    """Return the (unordered) column indices of the k largest scores per row."""
+    if k >= scores.shape[1]:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+class EmbeddingFaceRecognizer:
+    """
+    Recognizes faces by comparing SFace embeddings against a gallery.
+
+    Unlike the LBPH-based FaceRecognizer, identification cost is one matrix
+    multiply over the gallery, which stays fast for tens of thousands of
+    identities.
+    """
+
+    INPUT_SIZE = (112, 112)
+
+    def __init__(self, face_detector=None, model_file=None, match_threshold=0.363,
+                 shard_rows=None):
+        """
+        Initialize the embedding recognizer.
+
+        Args:
+            face_detector: A face detector instance (defaults to HaarFaceDetector)
+            model_file: Path to the SFace ONNX model (defaults to the 'sface'
+                model from jarvis.face.models)
+            match_threshold: Minimum cosine similarity to accept a match
+            shard_rows: If set, search the gallery in blocks of this many rows
+        """
+        if face_detector is None:
+            self.face_detector = HaarFaceDetector()
+        else:
+            self.face_detector = face_detector
+        self.match_threshold = match_threshold
+
+        # The model is shared process-wide and only looked up locally (see
+        # jarvis.face.models); an explicit model_file is used as given
+        if model_file is None:
+            self._shared_embedder = models.load_net(
+                'sface', lambda path: cv2.FaceRecognizerSF.create(path, ""))
+        else:
+            self._shared_embedder = resources.get_net(
+                ('sface', os.path.abspath(model_file)),
+                lambda: models.SharedNet(cv2.FaceRecognizerSF.create(model_file, "")))
+        self.embedder = self._shared_embedder.net
+        self.preprocessor = FacePreprocessor(size=self.INPUT_SIZE, grayscale=False)
+        self._face_buffer = np.empty(self.preprocessor.shape, dtype=np.uint8)
+        self.gallery = None
+        self.identity_cache = IdentityCache()
+        self._shard_rows = shard_rows
+        self.subject_to_label = {}
+        self.label_to_subject = {}
+
+    @property
+    def is_trained(self):
+        """Whether the gallery contains any faces."""
+        return self.gallery is not None and len(self.gallery) > 0
+
+    def compute_embedding(self, image, face_rect, left_eye_rect=None, right_eye_rect=None):
+        """
+        Compute the embedding of one face.
+
+        Args:
+            image: Input image (BGR format)
+            face_rect: Face rectangle in (x, y, w, h) format
+            left_eye_rect: Optional image-left eye rectangle, used for alignment
+            right_eye_rect: Optional image-right eye rectangle, used for alignment
+
+        Returns:
+            A 1D float32 embedding, or None if the rectangle is outside the image
+        """
+        if rects.clip_rect(face_rect, image) is None:
+            return None
+        face = self.preprocessor.process(
+            image, face_rect, left_eye_rect, right_eye_rect, out=self._face_buffer)
+        with self._shared_embedder.lock:
+            return self.embedder.feature(face).ravel().copy()
+
+    def add_face(self, subject, image, face_rect=None):
+        """
+        Add a face to the gallery.
+
+        Args:
+            subject: The subject (person) name
+            image: Input image (BGR format)
+            face_rect: Face rectangle, detected if not provided
+
+        Returns:
+            True if a face was added
+        """
+        if face_rect is None:
+            face_rects = self.face_detector.detect_faces(image)
+            if len(face_rects) == 0:
+                return False
+            face_rect = face_rects[0]
+
+        embedding = self.compute_embedding(image, face_rect)
+        if embedding is None:
+            return False
+        if self.gallery is None:
+            self.gallery = GalleryIndex(len(embedding), shard_rows=self._shard_rows)
+        self.gallery.add(embedding, self._label_for(subject))
+        return True
+
+    def train(self, training_data_path):
+        """
+        Add every image in the training data path to the gallery.
+        Each subdirectory should be named after the subject (person) it contains.
+
+        Args:
+            training_data_path: Path to directory containing subject subdirectories
+        """
+        count = 0
+        for subject in os.listdir(training_data_path):
+            if subject.startswith('.'):
+                continue
+            print(f"Processing subject: {subject}")
+            subject_path = os.path.join(training_data_path, subject)
+            for image_name in os.listdir(subject_path):
+                # Ignore system files like .DS_Store
+                if image_name.startswith('.') or image_name == 'name.txt':
+                    continue
+                image = cv2.imread(os.path.join(subject_path, image_name))
+                if image is not None and self.add_face(subject, image):
+                    count += 1
+        print(f"Gallery contains {count} new faces")
+
+    def identify(self, embeddings, k=1):
+        """
+        Identify a batch of embeddings against the gallery.
+
+        Args:
+            embeddings: Array of shape (n, dimension)
+            k: Number of candidates to return per embedding
+
+        Returns:
+            List of n lists of (subject_name, similarity) tuples, best first.
+            Subjects below the match threshold are reported as None.
+        """
+        if not self.is_trained:
+            return [[] for _ in range(len(embeddings))]
+        labels, scores = self.gallery.search(embeddings, k)
+        results = []
+        for row_labels, row_scores in zip(labels, scores):
+            results.append([
+                (self.label_to_subject.get(int(label))
+                 if score >= self.match_threshold else None, float(score))
+                for label, score in zip(row_labels, row_scores)])
+        return results
+
+    def recognize(self, image):
+        """
+        Recognize a face in an image.
+
+        Args:
+            image: Input image (BGR format)
+
+        Returns:
+            Tuple of (subject_name, similarity) or (None, None) if no face detected
+        """
+        if not self.is_trained:
+            print("Recognizer not trained")
+            return None, None
+
+        face_rects = self.face_detector.detect_faces(image)
+        if len(face_rects) == 0:
+            return None, None
+
+        embedding = self.compute_embedding(image, face_rects[0])
+        if embedding is None:
+            return None, None
+        return self.identify(embedding[np.newaxis])[0][0]
+
+    def recognize_faces(self, frame, faces):
+        """
+        Recognize already-detected faces, reusing cached results per track.
+
+        Embeddings are only computed for faces that are new, have drifted or
+        whose cached result has decayed, and all of them are matched against
+        the gallery in a single search.
+
+        Args:
+            frame: Input image (BGR format)
+            faces: List of Face objects, ideally with track_id set
+
+        Returns:
+            List of (subject_name, similarity) tuples, one per face, with
+            (None, None) for faces that could not be identified
+        """
+        results = [(None, None)] * len(faces)
+        if not self.is_trained or not faces:
+            return results
+
+        pending = []
+        embeddings = []
+        for i, face in enumerate(faces):
+            cached = self.identity_cache.lookup(face)
+            if cached is not None:
+                results[i] = cached
+            elif face.face_rect is not None:
+                embedding = self.compute_embedding(
+                    frame, face.face_rect, face.left_eye_rect, face.right_eye_rect)
+                if embedding is not None:
+                    pending.append(i)
+                    embeddings.append(embedding)
+
+        if pending:
+            matches = self.identify(np.stack(embeddings))
+            for i, candidates in zip(pending, matches):
+                subject, similarity = candidates[0]
+                # Similarity at the match threshold maps to a certainty of 0.5
+                certainty = min(max(similarity / (2.0 * self.match_threshold), 0.0), 1.0)
+                self.identity_cache.store(faces[i], subject, similarity, certainty)
+                results[i] = (subject, similarity)
+
+        self.identity_cache.prune({face.track_id for face in faces})
+        return results
+
+    def reset_tracks(self, track_id=None):
+        """Forget cached identities for one track, or for all tracks."""
+        self.identity_cache.reset(track_id)
+
+    def save(self, path_prefix):
+        """
+        Save the gallery and label maps.
+
+        Args:
+            path_prefix: Prefix for the gallery files and '<prefix>.json'
+        """
+        if not self.is_trained:
+            print("Recognizer not trained")
+            return
+        self.gallery.save(path_prefix)
+        with open(path_prefix + '.json', 'w') as labels_file:
+            json.dump({'subject_to_label': self.subject_to_label}, labels_file, indent=2)
+
+    def load(self, path_prefix, mmap=False):
+        """
+        Load a gallery and label maps written by save().
+
+        Args:
+            path_prefix: Prefix the gallery was saved with
+            mmap: Whether to memory-map the gallery embeddings
+        """
+        self.gallery = GalleryIndex.load(path_prefix, mmap=mmap, shard_rows=self._shard_rows)
+        with open(path_prefix + '.json') as labels_file:
+            state = json.load(labels_file)
+        self.subject_to_label = dict(state['subject_to_label'])
+        self.label_to_subject = {
+            label: subject for subject, label in self.subject_to_label.items()}
+        self.identity_cache.reset()
+
+    def _label_for(self, subject):
+        """Return the numeric label for a subject, assigning one if needed."""
+        if subject not in self.subject_to_label:
+            label = len(self.subject_to_label)
+            self.subject_to_label[subject] = label
+            self.label_to_subject[label] = subject
+        return self.subject_to_label[subject]
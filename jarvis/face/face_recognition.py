@@ -1,65 +1,284 @@
 #!/usr/bin/env python3
 
+import json
 import os
 import cv2
 import numpy as np
 from jarvis.utils import helpers as utils
+from .crop_cache import FaceCropCache
+from .gallery import FaceGallery
 from .haar_detector import HaarFaceDetector
+from .identity_cache import IdentityCache
+from .preprocessing import FacePreprocessor
 
 class FaceRecognizer:
     """
     Recognizes faces based on trained data using Local Binary Pattern Histograms.
     """
-    def __init__(self, face_detector=None):
+    def __init__(self, face_detector=None, crop_cache=None, use_crop_cache=True,
+                 distance_threshold=80.0, preprocessor=None):
         """
         Initialize the face recognizer.
         
         Args:
             face_detector: A face detector instance (defaults to HaarFaceDetector)
+            crop_cache: A FaceCropCache instance (defaults to the shared on-disk cache)
+            use_crop_cache: Whether to cache detected face crops between runs
+            distance_threshold: LBPH distance at which a match is considered doubtful
+            preprocessor: A FacePreprocessor used for both training and recognition
         """
         if face_detector is None:
             self.face_detector = HaarFaceDetector()
         else:
             self.face_detector = face_detector
             
+        if not use_crop_cache:
+            self.crop_cache = None
+        elif crop_cache is None:
+            self.crop_cache = FaceCropCache()
+        else:
+            self.crop_cache = crop_cache
+        # Crops found by other detectors (or settings) aren't reused
+        self._crop_namespace = FaceCropCache.detector_namespace(self.face_detector)
+
         # Create the recognizer
         self.face_recognizer = cv2.face.LBPHFaceRecognizer_create()
         self.subject_to_label = {}
         self.label_to_subject = {}
         self.is_trained = False
+        self.distance_threshold = distance_threshold
+        self.identity_cache = IdentityCache()
+
+        # Every crop is aligned and resized to the same canonical size, so
+        # LBPH histogram cost is the same for every face
+        if preprocessor is None:
+            self.preprocessor = FacePreprocessor()
+        else:
+            self.preprocessor = preprocessor
+        self._face_buffer = np.empty(self.preprocessor.shape, dtype=np.uint8)
+
+        # Images already in the model: absolute path -> [size, mtime_ns]
+        self._trained_images = {}
     
     def train(self, training_data_path, show_progress=True):
         """
         Train the recognizer with images from the training data path.
         Each subdirectory should be named after the subject (person) it contains.
         
+        If the recognizer is already trained (or was loaded from disk), only
+        new subjects and images are added to the model. A full retrain only
+        happens when previously trained images were changed or removed.
+
         Args:
             training_data_path: Path to directory containing subject subdirectories
             show_progress: Whether to show visual progress during training
         """
-        faces = []
-        labels = []
-        
         if show_progress:
             cv2.namedWindow('Training...')
             cv2.moveWindow('Training...', 0, 0)
 
+        incremental = self.is_trained
+        faces, labels, image_keys, is_stale = self._collect_faces(
+            training_data_path, show_progress, skip_trained=incremental)
+
+        if incremental and is_stale:
+            # LBPH cannot forget histograms, so start from scratch
+            print("Trained images changed or were removed, retraining")
+            incremental = False
+            self._trained_images = {}
+            self.identity_cache.reset()
+            faces, labels, image_keys, _ = self._collect_faces(
+                training_data_path, show_progress, skip_trained=False)
+
+        # Clean up after ourselves
+        if show_progress:
+            cv2.destroyWindow('Training...')
+            cv2.waitKey(1)
+            cv2.destroyAllWindows()
+
+        if self.crop_cache is not None:
+            self.crop_cache.save()
+
+        # Train the recognizer if we have faces
+        if len(faces) > 0:
+            if incremental:
+                print(f"Updating model with {len(faces)} new faces")
+                self.face_recognizer.update(faces, np.array(labels))
+            else:
+                print(f"Training with {len(faces)} faces")
+                self.face_recognizer.train(faces, np.array(labels))
+            self._trained_images.update(image_keys)
+            self.is_trained = True
+            print("Training complete!")
+        elif incremental:
+            print("Model is up to date")
+        else:
+            print("No faces found for training")
+
+    def save(self, model_path):
+        """
+        Save the trained model and its label maps.
+
+        The LBPH model is written to model_path and the label maps (plus the
+        list of trained images, for incremental updates) to model_path + '.json'.
+
+        Args:
+            model_path: Path of the model file (e.g. 'faces.yml')
+        """
+        if not self.is_trained:
+            print("Recognizer not trained")
+            return
+        self.face_recognizer.write(model_path)
+        state = {
+            'subject_to_label': self.subject_to_label,
+            'trained_images': self._trained_images,
+        }
+        with open(model_path + '.json', 'w') as labels_file:
+            json.dump(state, labels_file, indent=2)
+
+    def load(self, model_path):
+        """
+        Load a model and its label maps previously written by save().
+
+        Args:
+            model_path: Path of the model file
+        """
+        self.face_recognizer.read(model_path)
+        with open(model_path + '.json') as labels_file:
+            state = json.load(labels_file)
+        self.subject_to_label = dict(state['subject_to_label'])
+        self.label_to_subject = {
+            label: subject for subject, label in self.subject_to_label.items()}
+        self._trained_images = dict(state.get('trained_images', {}))
+        self.identity_cache.reset()
+        self.is_trained = True
+
+    def pack_gallery(self, training_data_path, gallery_path, metadata=None):
+        """
+        Pack a training data directory into a single gallery file.
+
+        The faces are detected (using the crop cache) and preprocessed
+        exactly as for train(), so the gallery can later be used with
+        train_gallery() without decoding any images.
+
+        Args:
+            training_data_path: Path to directory containing subject subdirectories
+            gallery_path: Path of the gallery file to write
+            metadata: Optional dict stored in the gallery header
+
+        Returns:
+            The number of faces in the gallery
+        """
+        faces, labels, _, _ = self._collect_faces(
+            training_data_path, show_progress=False, skip_trained=False)
+        if self.crop_cache is not None:
+            self.crop_cache.save()
+        if len(faces) == 0:
+            print("No faces found for the gallery")
+            return 0
+
+        metadata = dict(metadata or {})
+        metadata.setdefault('source', os.path.abspath(training_data_path))
+        FaceGallery.write(gallery_path, faces, labels, self.label_to_subject, metadata)
+        print(f"Packed {len(faces)} faces into {gallery_path}")
+        return len(faces)
+
+    def train_gallery(self, gallery_path):
+        """
+        Train the recognizer from a gallery file written by pack_gallery().
+
+        The gallery's crops are memory-mapped and passed to LBPH as they
+        are. This replaces any previously trained model.
+
+        Args:
+            gallery_path: Path of the gallery file
+        """
+        gallery = FaceGallery(gallery_path)
+        if gallery.crop_shape != self.preprocessor.shape:
+            raise ValueError(
+                f"Gallery crops are {gallery.crop_shape}, expected {self.preprocessor.shape}")
+        if len(gallery) == 0:
+            print("No faces found for training")
+            return
+
+        self.label_to_subject = dict(gallery.label_to_subject)
+        self.subject_to_label = {
+            subject: label for label, subject in self.label_to_subject.items()}
+        self._trained_images = {}
+        self.identity_cache.reset()
+
+        print(f"Training with {len(gallery)} faces")
+        self.face_recognizer.train(list(gallery.crops), np.asarray(gallery.labels))
+        self.is_trained = True
+        print("Training complete!")
+
+    def evaluate_gallery(self, gallery_path):
+        """
+        Measure recognition accuracy on a gallery file.
+
+        Args:
+            gallery_path: Path of the gallery file
+
+        Returns:
+            Dict with the number of faces, the number recognised correctly
+            and the accuracy
+        """
+        if not self.is_trained:
+            print("Recognizer not trained")
+            return None
+
+        gallery = FaceGallery(gallery_path)
+        correct = 0
+        for crop, label in zip(gallery.crops, gallery.labels):
+            predicted, _ = self.face_recognizer.predict(crop)
+            if self.label_to_subject.get(predicted) == gallery.label_to_subject.get(int(label)):
+                correct += 1
+        count = len(gallery)
+        return {
+            'count': count,
+            'correct': correct,
+            'accuracy': correct / float(count) if count else 0.0,
+        }
+
+    def _collect_faces(self, training_data_path, show_progress, skip_trained):
+        """
+        Gather face crops and labels from the training data path.
+
+        Args:
+            training_data_path: Path to directory containing subject subdirectories
+            show_progress: Whether to show visual progress
+            skip_trained: Whether to skip images that are already in the model
+
+        Returns:
+            Tuple of (faces, labels, image_keys, is_stale) where image_keys maps
+            each contributing image to [size, mtime_ns] and is_stale is True if
+            any previously trained image was changed or removed
+        """
+        faces = []
+        labels = []
+        image_keys = {}
+        seen_images = set()
+        is_stale = False
+
         dirs = os.listdir(training_data_path)
         print(f"Found {len(dirs)} subjects")
 
-        label = 0
         # Process each subject directory
         for dir_name in dirs:
             if dir_name.startswith('.'):
                 continue
                 
             subject = dir_name
+
+            # Map the subject name to a numeric label, keeping existing labels
+            if subject in self.subject_to_label:
+                label = self.subject_to_label[subject]
+            else:
+                label = max(self.label_to_subject, default=-1) + 1
+                self.subject_to_label[subject] = label
+                self.label_to_subject[label] = subject
             print(f"Processing subject: {subject} (label {label})")
             
-            # Map the subject name to a numeric label
-            self.subject_to_label[subject] = label
-            self.label_to_subject[label] = subject
-            
             subject_path = os.path.join(training_data_path, dir_name)
             subject_image_files = os.listdir(subject_path)
             
@@ -70,49 +289,66 @@ class FaceRecognizer:
                 if image_name.startswith('.') or image_name == 'name.txt':
                     continue
                     
-                print(f"  Processing image: {image_name}")
                 image_path = os.path.join(subject_path, image_name)
-                image = cv2.imread(image_path)
+                path, size, mtime_ns = FaceCropCache.image_key(image_path)
+                seen_images.add(path)
 
-                if show_progress:
-                    # Display an image window to show the image
-                    small_image = cv2.resize(image, None, fx=0.1, fy=0.1)
-                    cv2.imshow('Training...', small_image)
-                    cv2.waitKey(100)
+                trained_key = self._trained_images.get(path)
+                if trained_key is not None and trained_key != [size, mtime_ns]:
+                    is_stale = True
+                if skip_trained and trained_key == [size, mtime_ns]:
+                    continue
 
-                # Detect faces
-                face_rects = self.face_detector.detect_faces(image)
-                
-                if len(face_rects) > 0:
-                    # Use the first detected face
-                    x, y, w, h = face_rects[0]
-                    face = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)[y:y+h, x:x+w]
-                    
-                    if show_progress:
-                        small_rect = utils.scale_coordinates((x, y, w, h), 0.1)
-                        utils.draw_rectangle(small_image, small_rect)
-                        cv2.imshow('Training...', small_image)
-                        cv2.waitKey(100)
-                        
-                    faces.append(face)
+                print(f"  Processing image: {image_name}")
+                face = self._get_face_crop(image_path, show_progress)
+                if face is not None:
+                    faces.append(self.preprocessor.process(face))
                     labels.append(label)
+                    image_keys[path] = [size, mtime_ns]
 
-            label += 1
+        if not seen_images.issuperset(self._trained_images):
+            is_stale = True
 
-        # Clean up after ourselves
-        if show_progress:
-            cv2.destroyWindow('Training...')
-            cv2.waitKey(1)
-            cv2.destroyAllWindows()
+        return faces, labels, image_keys, is_stale
 
-        # Train the recognizer if we have faces
-        if len(faces) > 0:
-            print(f"Training with {len(faces)} faces")
-            self.face_recognizer.train(faces, np.array(labels))
-            self.is_trained = True
-            print("Training complete!")
-        else:
-            print("No faces found for training")
+    def _get_face_crop(self, image_path, show_progress):
+        """
+        Return the grayscale face crop for an image, using the crop cache.
+
+        Returns:
+            The face crop, or None if no face was detected
+        """
+        if self.crop_cache is not None:
+            hit, face = self.crop_cache.get(image_path, self._crop_namespace)
+            if hit:
+                return face
+
+        face = None
+        image = cv2.imread(image_path)
+        if image is not None:
+            if show_progress:
+                # Display an image window to show the image
+                small_image = cv2.resize(image, None, fx=0.1, fy=0.1)
+                cv2.imshow('Training...', small_image)
+                cv2.waitKey(100)
+
+            # Detect faces
+            face_rects = self.face_detector.detect_faces(image)
+
+            if len(face_rects) > 0:
+                # Use the first detected face
+                x, y, w, h = face_rects[0]
+                face = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)[y:y+h, x:x+w]
+
+                if show_progress:
+                    small_rect = utils.scale_coordinates((x, y, w, h), 0.1)
+                    utils.draw_rectangle(small_image, small_rect)
+                    cv2.imshow('Training...', small_image)
+                    cv2.waitKey(100)
+
+        if self.crop_cache is not None:
+            self.crop_cache.put(image_path, face, self._crop_namespace)
+        return face
     
     def recognize(self, image):
         """
@@ -135,8 +371,7 @@ class FaceRecognizer:
             return None, None
             
         # Use the first detected face
-        x, y, w, h = face_rects[0]
-        face = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)[y:y+h, x:x+w]
+        face = self.preprocessor.process(image, face_rects[0], out=self._face_buffer)
         
         # Recognize the face
         label, confidence = self.face_recognizer.predict(face)
@@ -146,3 +381,47 @@ class FaceRecognizer:
             return self.label_to_subject[label], confidence
         else:
             return None, confidence
+
+    def recognize_faces(self, frame, faces):
+        """
+        Recognize already-detected faces, reusing cached results per track.
+
+        Only faces that are new, have drifted or whose cached result has
+        decayed are identified; they are classified together in one batch.
+
+        Args:
+            frame: Input image (BGR or grayscale)
+            faces: List of Face objects, ideally with track_id set
+
+        Returns:
+            List of (subject_name, confidence) tuples, one per face, with
+            (None, None) for faces that could not be identified
+        """
+        results = [(None, None)] * len(faces)
+        if not self.is_trained or not faces:
+            return results
+
+        pending = []
+        for i, face in enumerate(faces):
+            cached = self.identity_cache.lookup(face)
+            if cached is not None:
+                results[i] = cached
+            elif face.face_rect is not None:
+                pending.append(i)
+
+        if pending:
+            # Fixed-size, aligned crops for every face that needs identifying
+            crops = self.preprocessor.process_faces(frame, [faces[i] for i in pending])
+            for i, crop in zip(pending, crops):
+                label, confidence = self.face_recognizer.predict(crop)
+                subject = self.label_to_subject.get(label)
+                certainty = min(max(1.0 - confidence / (2.0 * self.distance_threshold), 0.0), 1.0)
+                self.identity_cache.store(faces[i], subject, confidence, certainty)
+                results[i] = (subject, confidence)
+
+        self.identity_cache.prune({face.track_id for face in faces})
+        return results
+
+    def reset_tracks(self, track_id=None):
+        """Forget cached identities for one track, or for all tracks."""
+        self.identity_cache.reset(track_id)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Compact, memory-mappable file format for face galleries.
+
+A gallery file holds every training face as a fixed-size uint8 crop in one
+contiguous array, alongside a label per crop and a JSON header with the
+subject names and free-form metadata:
+
+    magic (8 bytes) | header length (uint64 LE) | JSON header | padding |
+    crops (count x height x width uint8) | padding | labels (count int32 LE)
+
+Both arrays start on 64-byte boundaries so they can be memory-mapped
+directly, and the whole gallery can be copied between hosts as one file.
+"""
+
+import json
+import struct
+import time
+
+import numpy as np
+
+
+class FaceGallery:
+    """A read-only, memory-mapped face gallery file."""
+
+    MAGIC = b'JVGALLRY'
+    VERSION = 1
+    ALIGNMENT = 64
+
+    def __init__(self, path):
+        """
+        Open a gallery file.
+
+        Args:
+            path: Path of a file written by FaceGallery.write()
+        """
+        self.path = path
+        with open(path, 'rb') as gallery_file:
+            magic = gallery_file.read(len(self.MAGIC))
+            if magic != self.MAGIC:
+                raise ValueError(f"{path} is not a face gallery file")
+            header_length, = struct.unpack('<Q', gallery_file.read(8))
+            header = json.loads(gallery_file.read(header_length).decode('utf-8'))
+
+        if header['version'] != self.VERSION:
+            raise ValueError(f"Unsupported face gallery version {header['version']}")
+
+        count = header['count']
+        height, width = header['crop_shape']
+        self.label_to_subject = {
+            int(label): subject for label, subject in header['subjects'].items()}
+        self.metadata = header.get('metadata', {})
+
+        if count == 0:
+            self.crops = np.empty((0, height, width), dtype=np.uint8)
+            self.labels = np.empty(0, dtype=np.int32)
+        else:
+            self.crops = np.memmap(path, dtype=np.uint8, mode='r',
+                                   offset=header['crops_offset'],
+                                   shape=(count, height, width))
+            self.labels = np.memmap(path, dtype='<i4', mode='r',
+                                    offset=header['labels_offset'], shape=(count,))
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def crop_shape(self):
+        """The (height, width) of every crop."""
+        return self.crops.shape[1:]
+
+    @classmethod
+    def write(cls, path, crops, labels, label_to_subject, metadata=None):
+        """
+        Write a gallery file.
+
+        Args:
+            path: Output path
+            crops: Sequence of equally sized 2D uint8 crops
+            labels: Sequence of integer labels, one per crop
+            label_to_subject: Dict mapping labels to subject names
+            metadata: Optional JSON-serialisable dict stored in the header
+        """
+        crops = np.asarray(crops, dtype=np.uint8)
+        labels = np.asarray(labels, dtype='<i4')
+        if crops.ndim != 3 or len(crops) != len(labels):
+            raise ValueError("Expected one 2D crop per label")
+
+        metadata = dict(metadata or {})
+        metadata.setdefault('created', time.strftime('%Y-%m-%dT%H:%M:%S%z'))
+        header = {
+            'version': cls.VERSION,
+            'count': len(crops),
+            'crop_shape': list(crops.shape[1:]),
+            'subjects': {str(label): subject
+                         for label, subject in label_to_subject.items()},
+            'metadata': metadata,
+        }
+
+        # The offsets depend on the header's own length, so fix its size
+        # with placeholders before filling them in
+        header['crops_offset'] = header['labels_offset'] = 0
+        prefix_length = len(cls.MAGIC) + 8 + len(json.dumps(header)) + 32
+        header['crops_offset'] = _align(prefix_length, cls.ALIGNMENT)
+        header['labels_offset'] = _align(
+            header['crops_offset'] + crops.nbytes, cls.ALIGNMENT)
+        encoded_header = json.dumps(header).encode('utf-8')
+
+        with open(path, 'wb') as gallery_file:
+            gallery_file.write(cls.MAGIC)
+            gallery_file.write(struct.pack('<Q', len(encoded_header)))
+            gallery_file.write(encoded_header)
+            gallery_file.seek(header['crops_offset'])
+            gallery_file.write(np.ascontiguousarray(crops).tobytes())
+            gallery_file.seek(header['labels_offset'])
+            gallery_file.write(labels.tobytes())
+
+
+def _align(offset, alignment):
+    """Round an offset up to a multiple of alignment."""
+    return (offset + alignment - 1) // alignment * alignment
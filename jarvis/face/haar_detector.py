@@ -2,8 +2,8 @@
 
 import cv2
 import numpy as np
-import os
 from .base import BaseFaceDetector
+from . import resources
 
 class HaarFaceDetector(BaseFaceDetector):
     """
@@ -28,18 +28,16 @@ class HaarFaceDetector(BaseFaceDetector):
         self.scale_factor = scale_factor
         self.min_neighbors = min_neighbors
         
-        # Get the correct path to cascade files
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        cascade_dir = os.path.join(base_dir, 'cascades')
-        
         # Use the default classifier if none provided
         if classifier_file is None:
-            self.classifier_file = os.path.join(cascade_dir, 'haarcascade_frontalface_default.xml')
+            self.classifier_file = resources.cascade_path('haarcascade_frontalface_default.xml')
         else:
             self.classifier_file = classifier_file
-            
-        # Load the cascade classifier
-        self.detector = cv2.CascadeClassifier(self.classifier_file)
+    
+    @property
+    def detector(self):
+        """The cascade classifier, loaded on first use and shared process-wide."""
+        return resources.get_cascade(self.classifier_file)
     
     def detect_faces(self, image):
         """
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Per-track caching of face recognition results.
+"""
+
+from jarvis.utils import rects
+
+
+class IdentityCache:
+    """
+    Remembers the identity recognised for each tracked face.
+
+    Each result is stored with a certainty between 0.0 and 1.0 that decays
+    every frame. A face is only re-identified once its decayed certainty
+    drops below a threshold, its rectangle drifts away from where it was
+    identified, or its track is reset. Faces without a track_id are never
+    cached.
+    """
+
+    def __init__(self, decay=0.97, min_certainty=0.5, min_interval=5,
+                 min_overlap=0.3):
+        """
+        Initialize the cache.
+
+        Args:
+            decay: Factor the certainty is multiplied by each frame
+            min_certainty: Certainty below which a face is re-identified
+            min_interval: Minimum number of frames between re-identifications
+            min_overlap: Minimum overlap with the identified rectangle
+        """
+        self.decay = decay
+        self.min_certainty = min_certainty
+        self.min_interval = min_interval
+        self.min_overlap = min_overlap
+        self._entries = {}
+
+    def lookup(self, face):
+        """
+        Age the cached result for a face and return it if still usable.
+
+        Args:
+            face: A Face with a face_rect and track_id
+
+        Returns:
+            Tuple of (subject_name, confidence), or None if the face needs
+            to be (re-)identified
+        """
+        entry = self._entries.get(face.track_id)
+        if entry is None:
+            return None
+
+        entry['age'] += 1
+        entry['certainty'] *= self.decay
+        if (face.face_rect is not None and rects.intersection_over_union(
+                face.face_rect, entry['rect']) < self.min_overlap):
+            return None
+        if entry['age'] >= self.min_interval and entry['certainty'] < self.min_certainty:
+            return None
+        return entry['subject'], entry['confidence']
+
+    def store(self, face, subject, confidence, certainty):
+        """
+        Cache the result of identifying a face.
+
+        Args:
+            face: The identified Face
+            subject: The recognised subject name (or None)
+            confidence: The recognizer's confidence value, returned as-is
+            certainty: How sure the recognizer is, from 0.0 to 1.0
+        """
+        if face.track_id is None or face.face_rect is None:
+            return
+        self._entries[face.track_id] = {
+            'subject': subject,
+            'confidence': confidence,
+            'certainty': certainty,
+            'rect': tuple(face.face_rect),
+            'age': 0,
+        }
+
+    def prune(self, track_ids):
+        """Forget every track that is not in track_ids."""
+        for track_id in list(self._entries):
+            if track_id not in track_ids:
+                del self._entries[track_id]
+
+    def reset(self, track_id=None):
+        """Forget one track, or every track if track_id is None."""
+        if track_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(track_id, None)
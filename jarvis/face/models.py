@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+"""
+Registry of the DNN model files Jarvis uses.
+
+Model files are looked up, never downloaded, when a detector or recognizer
+starts: in the directories listed in JARVIS_MODEL_PATH, then in the
+project's models/ directory, then in the Jarvis cache directory. Files are
+fetched only on request (see scripts/fetch_models.py), which also records
+their SHA-256 in a checksums.json beside them. Every later load is checked
+against that record, or against a checksum pinned in MODELS, so a truncated
+or swapped file is reported instead of being loaded. A file with neither is
+refused too, unless JARVIS_ALLOW_UNVERIFIED_MODELS is set; the warning
+logged names the fetch_models.py --trust-existing command that records it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from jarvis.utils import helpers as utils
+from . import resources
+
+
+# name -> list of (file name, pinned SHA-256 or None, download URL)
+MODELS = {
+    'opencv_face_detector': [
+        ('opencv_face_detector_uint8.pb', None,
+         "https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20180220_uint8/opencv_face_detector_uint8.pb"),
+        ('opencv_face_detector.pbtxt', None,
+         "https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/opencv_face_detector.pbtxt"),
+    ],
+    'sface': [
+        ('face_recognition_sface_2021dec.onnx', None,
+         "https://github.com/opencv/opencv_zoo/raw/main/models/face_recognition_sface/face_recognition_sface_2021dec.onnx"),
+    ],
+}
+
+CHECKSUMS_FILE = 'checksums.json'
+
+# Set (to anything but '' or '0') to load files that have no checksum
+ALLOW_UNVERIFIED_ENV = 'JARVIS_ALLOW_UNVERIFIED_MODELS'
+
+
+class ModelError(IOError):
+    """A model file is missing or doesn't match its checksum."""
+
+
+class SharedNet:
+    """
+    A loaded net shared by every user in the process.
+
+    OpenCV nets keep their input and outputs as state, so inference must be
+    run while holding the net's lock.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.lock = threading.Lock()
+
+
+def search_paths():
+    """Return the directories model files are looked for in, in order."""
+    paths = [path for path in os.environ.get('JARVIS_MODEL_PATH', '').split(os.pathsep)
+             if path]
+    project_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    paths.append(os.path.join(project_dir, 'models'))
+    paths.append(utils.get_cache_dir('models'))
+    return paths
+
+
+def resolve(name):
+    """
+    Return the verified paths of a model's files, without any network access.
+
+    Args:
+        name: A key of MODELS
+
+    Raises:
+        ModelError: If a file can't be found, or doesn't match its checksum,
+            or has no checksum to be verified against (unless
+            JARVIS_ALLOW_UNVERIFIED_MODELS is set)
+    """
+    paths = []
+    for file_name, pinned_sha256, _ in MODELS[name]:
+        for directory in search_paths():
+            path = os.path.join(directory, file_name)
+            if os.path.isfile(path):
+                break
+        else:
+            raise ModelError(
+                f"Model file {file_name} not found in {os.pathsep.join(search_paths())}; "
+                f"run scripts/fetch_models.py or set JARVIS_MODEL_PATH")
+        expected = pinned_sha256 or _recorded_checksum(path)
+        if expected is None:
+            # E.g. a file fetched before checksums were recorded
+            command = (f"python scripts/fetch_models.py {name} "
+                       f"--dir {os.path.dirname(path)} --trust-existing")
+            if os.environ.get(ALLOW_UNVERIFIED_ENV, '') in ('', '0'):
+                logging.warning(f"Not loading {path}: it has no recorded checksum. "
+                                f"If the file is known to be good, record its "
+                                f"checksum once with: {command}")
+                raise ModelError(
+                    f"No checksum to verify {path} against; copy the {CHECKSUMS_FILE} "
+                    f"written by scripts/fetch_models.py beside it, run {command}, "
+                    f"or set {ALLOW_UNVERIFIED_ENV}=1 to load it unverified")
+            logging.warning(f"Loading {path} without verifying its checksum; "
+                            f"record it with: {command}")
+        elif _verified_checksum(path) != expected:
+            raise ModelError(f"Checksum mismatch for {path}")
+        paths.append(path)
+    return paths
+
+
+def load_net(name, load):
+    """
+    Return the process-wide SharedNet for a model.
+
+    Args:
+        name: A key of MODELS
+        load: Called with the model's file paths to create the net the
+            first time it is needed
+
+    Raises:
+        ModelError: See resolve()
+    """
+    paths = resolve(name)
+    return resources.get_net((name,) + tuple(paths), lambda: SharedNet(load(*paths)))
+
+
+def fetch(name, directory=None, trust_existing=False):
+    """
+    Download a model's missing files and record their checksums.
+
+    Files already in the directory are checked against their recorded or
+    pinned checksum instead; only downloaded files get a checksum recorded,
+    unless trust_existing is set.
+
+    Args:
+        name: A key of MODELS
+        directory: Where to put the files (defaults to the cache directory)
+        trust_existing: Record the checksum of existing files that have
+            none, e.g. ones fetched before checksums were recorded
+
+    Returns:
+        The paths of the model's files
+
+    Raises:
+        ModelError: If a file doesn't match its checksum, or an existing
+            file has no checksum to be verified against
+    """
+    import urllib.request
+
+    directory = directory or utils.get_cache_dir('models')
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for file_name, pinned_sha256, url in MODELS[name]:
+        path = os.path.join(directory, file_name)
+        if not os.path.isfile(path):
+            print(f"Downloading {file_name} from {url}")
+            temp_path = path + '.part'
+            urllib.request.urlretrieve(url, temp_path)
+            sha256 = _file_sha256(temp_path)
+            if pinned_sha256 is not None and sha256 != pinned_sha256:
+                os.remove(temp_path)
+                raise ModelError(f"Checksum mismatch for downloaded {file_name}")
+            os.replace(temp_path, path)
+            _record_checksum(path, sha256)
+        else:
+            expected = pinned_sha256 or _recorded_checksum(path)
+            if expected is None:
+                if not trust_existing:
+                    raise ModelError(f"No checksum to verify {path} against; delete "
+                                     f"it to download it again, or pass --trust-existing")
+                print(f"Recording the checksum of existing {path}")
+                _record_checksum(path, _file_sha256(path))
+            elif _file_sha256(path) != expected:
+                raise ModelError(f"Checksum mismatch for {path}; "
+                                 f"delete it to download it again")
+        paths.append(path)
+    return paths
+
+
+# Checksums already verified this process: path -> (size, mtime_ns, sha256)
+_verified = {}
+
+
+def _verified_checksum(path):
+    """Return a file's SHA-256, hashing it only once per process per version."""
+    stat = os.stat(path)
+    cached = _verified.get(path)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    sha256 = _file_sha256(path)
+    _verified[path] = (stat.st_size, stat.st_mtime_ns, sha256)
+    return sha256
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as model_file:
+        for block in iter(lambda: model_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksums_path(path):
+    return os.path.join(os.path.dirname(path), CHECKSUMS_FILE)
+
+
+def _recorded_checksum(path):
+    try:
+        with open(_checksums_path(path)) as checksums_file:
+            return json.load(checksums_file).get(os.path.basename(path))
+    except (OSError, ValueError):
+        return None
+
+
+def _record_checksum(path, sha256):
+    checksums_path = _checksums_path(path)
+    try:
+        with open(checksums_path) as checksums_file:
+            checksums = json.load(checksums_file)
+    except (OSError, ValueError):
+        checksums = {}
+    checksums[os.path.basename(path)] = sha256
+    with open(checksums_path, 'w') as checksums_file:
+        json.dump(checksums, checksums_file, indent=2, sort_keys=True)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+Face-crop preprocessing shared by recognizer training and inference.
+"""
+
+import cv2
+import numpy as np
+from jarvis.utils import helpers as utils
+
+
+class FacePreprocessor:
+    """
+    Produces aligned, fixed-size, illumination-normalised face crops.
+
+    When both eye rectangles are known the crop is rotated and scaled so the
+    eyes land on fixed canonical positions; otherwise the face rectangle is
+    simply scaled to the canonical size. The canonical eye positions match
+    where the eyes typically sit in a detector's face rectangle, so aligned
+    and unaligned crops frame the face the same way.
+
+    Crop, rotation and scaling are a single warpAffine, so the cost depends
+    only on the output size, not on the size of the face or the frame.
+    """
+
+    def __init__(self, size=(96, 96), left_eye=(0.3, 0.38), right_eye=(0.7, 0.38),
+                 grayscale=True, normalize=True):
+        """
+        Initialize the preprocessor.
+
+        Args:
+            size: Output (width, height)
+            left_eye: Canonical position of the image-left eye, as fractions of size
+            right_eye: Canonical position of the image-right eye, as fractions of size
+            grayscale: Whether to output single-channel crops
+            normalize: Whether to equalize the histogram of grayscale crops
+        """
+        self.size = tuple(size)
+        self.grayscale = grayscale
+        self.normalize = normalize and grayscale
+        width, height = self.size
+        self._left_eye = complex(left_eye[0] * width, left_eye[1] * height)
+        self._right_eye = complex(right_eye[0] * width, right_eye[1] * height)
+        self._warp_buffer = None
+        self._batch_buffer = None
+
+    @property
+    def shape(self):
+        """The shape of a single output crop."""
+        width, height = self.size
+        return (height, width) if self.grayscale else (height, width, 3)
+
+    def process(self, image, face_rect=None, left_eye_rect=None, right_eye_rect=None,
+                out=None):
+        """
+        Produce the canonical crop of one face.
+
+        Args:
+            image: Input image (BGR or grayscale)
+            face_rect: Face rectangle in (x, y, w, h) format (defaults to the whole image)
+            left_eye_rect: Optional image-left eye rectangle
+            right_eye_rect: Optional image-right eye rectangle
+            out: Optional preallocated output array of self.shape
+
+        Returns:
+            The crop (out, if given)
+        """
+        if face_rect is None:
+            height, width = image.shape[:2]
+            face_rect = (0, 0, width, height)
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+
+        transform = self._transform(face_rect, left_eye_rect, right_eye_rect)
+        if self.grayscale and not utils.is_gray(image):
+            # Warp in colour first so only the small crop gets converted
+            if self._warp_buffer is None:
+                self._warp_buffer = np.empty(self.shape + (3,), dtype=np.uint8)
+            cv2.warpAffine(image, transform, self.size, self._warp_buffer,
+                           cv2.INTER_LINEAR, cv2.BORDER_REPLICATE)
+            cv2.cvtColor(self._warp_buffer, cv2.COLOR_BGR2GRAY, out)
+        elif not self.grayscale and utils.is_gray(image):
+            if self._warp_buffer is None:
+                self._warp_buffer = np.empty(self.shape[:2], dtype=np.uint8)
+            cv2.warpAffine(image, transform, self.size, self._warp_buffer,
+                           cv2.INTER_LINEAR, cv2.BORDER_REPLICATE)
+            cv2.cvtColor(self._warp_buffer, cv2.COLOR_GRAY2BGR, out)
+        else:
+            cv2.warpAffine(image, transform, self.size, out,
+                           cv2.INTER_LINEAR, cv2.BORDER_REPLICATE)
+
+        if self.normalize:
+            cv2.equalizeHist(out, out)
+        return out
+
+    def process_faces(self, image, faces):
+        """
+        Produce canonical crops for several faces in one image.
+
+        The crops are written into a batch buffer that is reused between
+        calls, so copy them if they must outlive the next call.
+
+        Args:
+            image: Input image (BGR or grayscale)
+            faces: List of Face objects with face_rect set
+
+        Returns:
+            Array of shape (len(faces),) + self.shape
+        """
+        count = len(faces)
+        if self._batch_buffer is None or len(self._batch_buffer) < count:
+            capacity = max(count, 4)
+            self._batch_buffer = np.empty((capacity,) + self.shape, dtype=np.uint8)
+        batch = self._batch_buffer[:count]
+        for face, out in zip(faces, batch):
+            self.process(image, face.face_rect, face.left_eye_rect,
+                         face.right_eye_rect, out)
+        return batch
+
+    def _transform(self, face_rect, left_eye_rect, right_eye_rect):
+        """Return the 2x3 affine transform from the image to the crop."""
+        x, y, w, h = face_rect
+        if left_eye_rect is not None and right_eye_rect is not None:
+            left_eye = _rect_centre(left_eye_rect)
+            right_eye = _rect_centre(right_eye_rect)
+            if right_eye.real > left_eye.real:
+                # Similarity transform mapping both eyes onto their canonical
+                # positions: z -> a * z + b in the complex plane
+                a = (self._right_eye - self._left_eye) / (right_eye - left_eye)
+                b = self._left_eye - a * left_eye
+                return np.array([[a.real, -a.imag, b.real],
+                                 [a.imag, a.real, b.imag]])
+
+        width, height = self.size
+        scale_x = width / float(w)
+        scale_y = height / float(h)
+        return np.array([[scale_x, 0.0, -x * scale_x],
+                         [0.0, scale_y, -y * scale_y]])
+
+
+def _rect_centre(rect):
+    """Return the centre of an (x, y, w, h) rectangle as a complex number."""
+    x, y, w, h = rect
+    return complex(x + w / 2.0, y + h / 2.0)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Process-wide cache of cascade classifiers and DNN nets.
+
+Detectors and recognizers ask for their cascades and nets here instead of
+loading them in their constructors, so each file is parsed once per
+process, and only when something first needs it.
+"""
+
+import os
+import threading
+
+import cv2
+
+
+CASCADE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cascades')
+
+_lock = threading.Lock()
+_cascades = {}
+_nets = {}
+
+
+def cascade_path(name):
+    """Return the path of a cascade bundled with Jarvis, e.g. 'haarcascade_eye.xml'."""
+    return os.path.join(CASCADE_DIR, name)
+
+
+def get_cascade(name_or_path):
+    """
+    Return the shared CascadeClassifier for a cascade file.
+
+    Args:
+        name_or_path: A bundled cascade's file name, or the path of any
+            cascade XML file
+
+    Raises:
+        IOError: If the cascade can't be loaded
+    """
+    path = name_or_path
+    if not os.path.dirname(path):
+        path = cascade_path(path)
+    path = os.path.abspath(path)
+
+    classifier = _cascades.get(path)
+    if classifier is None:
+        with _lock:
+            classifier = _cascades.get(path)
+            if classifier is None:
+                classifier = cv2.CascadeClassifier(path)
+                if classifier.empty():
+                    raise IOError(f"Could not load cascade classifier {path}")
+                _cascades[path] = classifier
+    return classifier
+
+
+def get_net(key, load):
+    """
+    Return the shared net for a key, calling load() to create it the first
+    time it is asked for.
+
+    Args:
+        key: Hashable identifying the net, e.g. its model path
+        load: Callable returning the net (e.g. wrapping cv2.dnn.readNet)
+    """
+    net = _nets.get(key)
+    if net is None:
+        with _lock:
+            net = _nets.get(key)
+            if net is None:
+                net = load()
+                _nets[key] = net
+    return net
+
+
+def clear():
+    """Forget every cached cascade and net."""
+    with _lock:
+        _cascades.clear()
+        _nets.clear()
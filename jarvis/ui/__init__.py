@@ -1,2 +1,11 @@
 """User interface modules."""
-from jarvis.ui.display import PyQtWindowManager, VideoDisplay
+from jarvis.ui.headless import HeadlessWindowManager
+
+
+def __getattr__(name):
+    # The Qt window is only imported when asked for, so that headless use
+    # of the package never loads PyQt5
+    if name in ('PyQtWindowManager', 'VideoDisplay'):
+        from jarvis.ui import display
+        return getattr(display, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,9 +4,9 @@ import logging
 import sys
 import cv2
 import numpy as np
-from jarvis.utils import colours
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal
-from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QFont
+from jarvis.utils.annotations import LABEL_PADDING
+from PyQt5.QtCore import Qt, QTimer, QPointF, QRectF, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QPainterPath, QPen, QColor, QFont
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QWidget, 
     QVBoxLayout, QHBoxLayout, QAction, QToolBar,
@@ -24,85 +24,114 @@ class VideoDisplay(QLabel):
         self.setAlignment(Qt.AlignCenter)
         self.setStyleSheet("background-color: black;")
         self._original_frame = None
-        self._debug_mode = False
-        self._faces = []
+        self._annotations = None
+        self._buffers = {}
         
-    def set_debug_mode(self, enabled):
-        """Enable or disable debug overlay"""
-        self._debug_mode = enabled
-        
-    def set_faces(self, faces):
-        """Set detected faces for debug overlay"""
-        self._faces = faces
+    def set_annotations(self, annotations):
+        """Set the Annotations (in frame coordinates) to paint over frames,
+        or None for no overlay."""
+        self._annotations = annotations
         
     def display_frame(self, frame):
-        """Display a frame (numpy array) with proper scaling."""
+        """Display a BGR frame (numpy array), scaled to fit the widget.
+
+        The frame is resized with OpenCV to the displayed size first, into
+        buffers that are reused while the widget keeps its size, so colour
+        conversion and the hand-off to Qt only touch displayed pixels and
+        Qt never rescales a full-resolution pixmap. Annotations are painted
+        as vectors over the pixmap, so they never cost a copy of the frame.
+        """
         if frame is None:
             return
-            
-        # Save the original frame as a working copy
-        display_frame = frame.copy()
-        
-        # Draw debug overlay if enabled
-        if self._debug_mode and self._faces:
-            # Draw with thick lines for better visibility
-            for face in self._faces:
-                # Draw face rectangle with a more refined thickness
-                if face.face_rect is not None:
-                    x, y, w, h = face.face_rect
-                    cv2.rectangle(display_frame, (x, y), (x+w, y+h), colours.FACE_COLOUR, 3)
-                
-                # Draw eye rectangles with more subtle thickness
-                if face.left_eye_rect is not None:
-                    x, y, w, h = face.left_eye_rect
-                    cv2.rectangle(display_frame, (x, y), (x+w, y+h), colours.LEFT_EYE_COLOUR, 2)
-                    
-                if face.right_eye_rect is not None:
-                    x, y, w, h = face.right_eye_rect
-                    cv2.rectangle(display_frame, (x, y), (x+w, y+h), colours.RIGHT_EYE_COLOUR, 2)
-                
-                # Draw nose and mouth rectangles with refined thickness
-                if face.nose_rect is not None:
-                    x, y, w, h = face.nose_rect
-                    cv2.rectangle(display_frame, (x, y), (x+w, y+h), colours.NOSE_COLOUR, 2)
-                    
-                if face.mouth_rect is not None:
-                    x, y, w, h = face.mouth_rect
-                    cv2.rectangle(display_frame, (x, y), (x+w, y+h), colours.MOUTH_COLOUR, 2)
-            
-            # Draw text for number of faces
-            h, w = display_frame.shape[:2]
-            found = "Faces: {}".format(len(self._faces))
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            x_pos = int(w * 0.05)
-            y_pos = int(h * 0.1)
-            # Create a background box for better text readability
-            text_size = cv2.getTextSize(found, font, 1.2, 2)[0]
-            box_coords = ((x_pos-10, y_pos+10), (x_pos + text_size[0]+10, y_pos - text_size[1]-10))
-            cv2.rectangle(display_frame, box_coords[0], box_coords[1], (0, 0, 0), -1)  # Filled black background
-            
-            # Draw text with improved readability
-            cv2.putText(display_frame, found, (x_pos, y_pos), font, 1.2, colours.TEXT_OUTLINE_COLOUR, 4, cv2.LINE_AA)
-            cv2.putText(display_frame, found, (x_pos, y_pos), font, 1.2, colours.HIGHLIGHT_TEXT_COLOUR, 2, cv2.LINE_AA)
-            
-        # Convert BGR to RGB format
-        rgb_frame = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
-        
-        # Convert to QImage
-        bytes_per_line = ch * w
-        q_image = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        
-        # Convert to QPixmap and scale to fit the widget while preserving aspect ratio
+
+        frame_h, frame_w = frame.shape[:2]
+        scale = min(self.width() / float(frame_w), self.height() / float(frame_h))
+        size = (max(int(frame_w * scale), 1), max(int(frame_h * scale), 1))
+
+        if size == (frame_w, frame_h):
+            display_frame = frame
+        else:
+            display_frame = self._resize(frame, size)
+
+        # Qt's RGB888 to pixmap conversion is optimised where BGR888's
+        # isn't, so swapping the channels at display size is the cheaper way
+        h, w = display_frame.shape[:2]
+        rgb_frame = self._buffer('rgb', (h, w, 3))
+        cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB, rgb_frame)
+        q_image = QImage(rgb_frame.data, w, h, rgb_frame.strides[0], QImage.Format_RGB888)
+
+        # fromImage copies the pixels, so the buffers can be reused next frame
         pixmap = QPixmap.fromImage(q_image)
-        scaled_pixmap = pixmap.scaled(self.width(), self.height(), 
-                                    Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.setPixmap(scaled_pixmap)
+        if self._annotations:
+            painter = QPainter(pixmap)
+            self._paint_annotations(painter, self._annotations, size[0] / float(frame_w))
+            painter.end()
+        self.setPixmap(pixmap)
+
+    def _resize(self, frame, size):
+        """Resize a frame to (width, height) into a reused buffer.
+
+        INTER_AREA is only fast for whole-number factors, so large
+        reductions first shrink by the largest whole factor with it and
+        finish with INTER_LINEAR.
+        """
+        frame_h, frame_w = frame.shape[:2]
+        factor = min(frame_w // size[0], frame_h // size[1])
+        if factor >= 2:
+            shrunk_size = (frame_w // factor, frame_h // factor)
+            shrunk = self._buffer('shrunk', shrunk_size[::-1] + frame.shape[2:])
+            cv2.resize(frame, shrunk_size, shrunk, interpolation=cv2.INTER_AREA)
+            frame = shrunk
+            if shrunk_size == size:
+                return shrunk
+        resized = self._buffer('resized', size[::-1] + frame.shape[2:])
+        cv2.resize(frame, size, resized, interpolation=cv2.INTER_LINEAR)
+        return resized
+
+    def _buffer(self, name, shape):
+        """Return a uint8 buffer of the given shape, reused between frames."""
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, np.uint8)
+        return buffer
+
+    def _paint_annotations(self, painter, annotations, scale):
+        """Paint annotations, with frame coordinates scaled by scale."""
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setBrush(Qt.NoBrush)
+        for rect, colour, thickness in annotations.rects:
+            x, y, w, h = (value * scale for value in rect)
+            painter.setPen(QPen(_qcolor(colour), thickness))
+            painter.drawRect(QRectF(x, y, w, h))
+
+        for label in annotations.labels:
+            # Hershey simplex glyphs are about 22 pixels tall at scale 1.0
+            font = QFont()
+            font.setPixelSize(max(int(round(22 * label.font_scale * scale)), 6))
+            font.setBold(True)
+            x, y = (value * scale for value in label.origin)
+            path = QPainterPath()
+            path.addText(QPointF(x, y), font, label.text)
+            if label.background is not None:
+                padding = LABEL_PADDING * scale
+                painter.fillRect(path.boundingRect().adjusted(
+                    -padding, -padding, padding, padding), _qcolor(label.background))
+            painter.strokePath(path, QPen(_qcolor(label.outline_colour), 3))
+            painter.fillPath(path, _qcolor(label.colour))
+
+
+def _qcolor(bgr):
+    """Convert an OpenCV BGR colour tuple to a QColor."""
+    b, g, r = bgr[:3]
+    return QColor(r, g, b)
 
 
 class PyQtWindowManager(QMainWindow):
     """Main application window and video display for Jarvis."""
     
+    # Frame rate used when the screen's refresh rate is unknown
+    DEFAULT_FPS = 60
+
     keyPressed = pyqtSignal(int)
     filterChanged = pyqtSignal(str, int)  # Filter name, intensity
     showFilteredChanged = pyqtSignal(bool)  # Whether to show filtered stream
@@ -145,6 +174,7 @@ class PyQtWindowManager(QMainWindow):
         self.current_intensity = 50  # Store intensity as a value, not a widget
         
         self._is_window_created = False
+        self._frame_timer = None
         
     def _create_menu(self):
         """Create the menu bar."""
@@ -489,7 +519,7 @@ class PyQtWindowManager(QMainWindow):
         """Handle key press signal."""
         if self.key_press_callback:
             # Only log function keys, not normal keyboard input
-            if keycode in [9, 27, 32, 120]:  # tab, esc, space, x
+            if keycode in [9, 27, 32, 97, 112, 116, 120]:  # tab, esc, space, a, p, t, x
                 logging.debug(f'UI key pressed: {keycode}')
             self.key_press_callback(keycode)
     
@@ -513,6 +543,20 @@ class PyQtWindowManager(QMainWindow):
             if text:
                 self.keyPressed.emit(ord(text[0]))
     
+    def set_show_detection(self, checked):
+        """Check or uncheck the detection controls, without emitting signals."""
+        # Block signals to prevent recursive callbacks
+        self.detection_action.blockSignals(True)
+        self.show_detection_cb.blockSignals(True)
+        
+        # Ensure the toolbar button and checkbox match our state
+        self.detection_action.setChecked(checked)
+        self.show_detection_cb.setChecked(checked)
+        
+        # Re-enable signals
+        self.detection_action.blockSignals(False)
+        self.show_detection_cb.blockSignals(False)
+    
     def create_window(self):
         """Create and show the window."""
         super(PyQtWindowManager, self).show()
@@ -527,6 +571,51 @@ class PyQtWindowManager(QMainWindow):
         self.close()
         self._is_window_created = False
     
+    def closeEvent(self, event):
+        """Stop the frame timer when the window is closed by any means."""
+        self._is_window_created = False
+        if self._frame_timer is not None:
+            self._frame_timer.stop()
+        super(PyQtWindowManager, self).closeEvent(event)
+    
+    def run(self, on_frame_timer, max_fps=None):
+        """
+        Run the Qt event loop until the window is closed.
+
+        Args:
+            on_frame_timer: Called up to max_fps times a second, to fetch and
+                show the newest frame
+            max_fps: Timer rate (defaults to the screen's refresh rate)
+        """
+        if not max_fps:
+            screen = self.app.primaryScreen()
+            max_fps = screen.refreshRate() if screen is not None else 0
+            max_fps = max_fps if max_fps > 0 else self.DEFAULT_FPS
+        logging.info(f"Refreshing the display at up to {max_fps:.0f} fps")
+        errors = []
+
+        def on_timeout():
+            # An exception escaping a Qt slot aborts the process, skipping
+            # the caller's cleanup; stop the loop and raise it from here
+            try:
+                on_frame_timer()
+            except Exception as error:
+                logging.error(f"Stopping after an error in the frame timer: {error!r}")
+                errors.append(error)
+                self._frame_timer.stop()
+                self.app.quit()
+
+        self._frame_timer = QTimer(self)
+        self._frame_timer.setTimerType(Qt.PreciseTimer)
+        self._frame_timer.timeout.connect(on_timeout)
+        self._frame_timer.start(max(int(1000.0 / max_fps), 1))
+        try:
+            self.app.exec_()
+        finally:
+            self._frame_timer.stop()
+        if errors:
+            raise errors[0]
+    
     def process_events(self):
         """Process pending events."""
         QApplication.processEvents()
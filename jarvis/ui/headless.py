@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+"""
+A stand-in for the window when running without a display.
+
+Nothing here imports Qt, so a headless Jarvis never loads PyQt5.
+"""
+
+import logging
+import time
+
+
+class HeadlessVideoDisplay:
+    """Accepts what the window's VideoDisplay would be given, and drops it."""
+
+    def set_annotations(self, annotations):
+        pass
+
+    def display_frame(self, frame):
+        pass
+
+
+class HeadlessWindowManager:
+    """Runs the frame loop of PyQtWindowManager, without a window."""
+
+    # Frame rate used when none is given
+    DEFAULT_FPS = 30
+
+    def __init__(self, key_press_callback=None):
+        self.key_press_callback = key_press_callback
+        self.video_display = HeadlessVideoDisplay()
+        self._is_window_created = False
+
+    def create_window(self):
+        self._is_window_created = True
+
+    def show_frame(self, frame):
+        pass
+
+    def set_show_detection(self, checked):
+        pass
+
+    def destroy_window(self):
+        self._is_window_created = False
+
+    def run(self, on_frame_timer, max_fps=None):
+        """
+        Call on_frame_timer up to max_fps times a second until
+        destroy_window() is called (or the process is interrupted).
+        """
+        interval = 1.0 / (max_fps or self.DEFAULT_FPS)
+        logging.info(f"Running headless at up to {1.0 / interval:.0f} fps")
+        next_tick = time.perf_counter()
+        while self._is_window_created:
+            on_frame_timer()
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running behind: don't try to catch up with a burst
+                next_tick = time.perf_counter()
+
+    def process_events(self):
+        pass
+
+    @property
+    def is_window_created(self):
+        return self._is_window_created
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""
+Vector descriptions of frame annotations, and an OpenCV rasterizer for them.
+
+Annotations are described once per frame, in frame coordinates, and each
+output renders them its own way: the Qt window paints them over the
+displayed pixmap, while streamed frames have them burned in by
+AnnotationRasterizer.
+"""
+
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy
+
+from jarvis.utils import colours
+
+
+# A rectangle outline: rect is (x, y, w, h) in frame coordinates
+RectAnnotation = namedtuple('RectAnnotation', ['rect', 'colour', 'thickness'])
+
+# A line of text drawn like cv2.putText at origin (the left end of the
+# baseline), with an outline and, unless background is None, a filled box
+LabelAnnotation = namedtuple('LabelAnnotation', [
+    'text', 'origin', 'font_scale', 'colour', 'outline_colour', 'background'])
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+TEXT_THICKNESS = 2
+OUTLINE_THICKNESS = 4
+# Space between a label's text and the edge of its background box
+LABEL_PADDING = 10
+
+
+class Annotations:
+    """The rectangles and labels to draw over one frame."""
+
+    def __init__(self):
+        self.rects = []
+        self.labels = []
+
+    def __bool__(self):
+        return bool(self.rects or self.labels)
+
+    def add_rect(self, rect, colour, thickness=2):
+        if rect is not None:
+            self.rects.append(RectAnnotation(tuple(rect), colour, thickness))
+
+    def add_label(self, text, origin, font_scale=1.0, colour=colours.HIGHLIGHT_TEXT_COLOUR,
+                  outline_colour=colours.TEXT_OUTLINE_COLOUR, background=colours.BLACK_BGR):
+        self.labels.append(LabelAnnotation(
+            text, tuple(origin), font_scale, colour, outline_colour, background))
+
+
+def annotate_faces(faces, frame_shape):
+    """
+    Describe the debug overlay for tracked faces.
+
+    Args:
+        faces: List of Face objects
+        frame_shape: Shape of the frame the faces were found in
+
+    Returns:
+        Annotations with each face's features, its track ID and a face count
+    """
+    annotations = Annotations()
+    for face in faces or []:
+        annotations.add_rect(face.face_rect, colours.FACE_COLOUR, 3)
+        annotations.add_rect(face.left_eye_rect, colours.LEFT_EYE_COLOUR, 2)
+        annotations.add_rect(face.right_eye_rect, colours.RIGHT_EYE_COLOUR, 2)
+        annotations.add_rect(face.nose_rect, colours.NOSE_COLOUR, 2)
+        annotations.add_rect(face.mouth_rect, colours.MOUTH_COLOUR, 2)
+        if face.face_rect is not None and face.track_id is not None:
+            x, y, w, h = face.face_rect
+            annotations.add_label(f"#{face.track_id}", (x, y - 8), 0.6,
+                                  colours.FACE_COLOUR, background=None)
+
+    h, w = frame_shape[:2]
+    annotations.add_label(f"Faces: {len(faces or [])}",
+                          (int(w * 0.05), int(h * 0.1)), 1.2)
+    return annotations
+
+
+class AnnotationRasterizer:
+    """
+    Burns annotations into images with OpenCV.
+
+    Labels are rendered once into small sprites (cached by text and style)
+    and then copied into each frame, instead of measuring and drawing the
+    text with cv2.putText twice per frame.
+    """
+
+    def __init__(self, max_sprites=64):
+        self.max_sprites = max_sprites
+        self._sprites = OrderedDict()
+
+    def draw(self, annotations, image):
+        """Draw annotations (in image coordinates) into image, in place."""
+        for rect, colour, thickness in annotations.rects:
+            x, y, w, h = (int(value) for value in rect)
+            cv2.rectangle(image, (x, y), (x+w, y+h), colour, thickness)
+        for label in annotations.labels:
+            self._draw_label(label, image)
+
+    def _draw_label(self, label, image):
+        sprite, mask, (offset_x, offset_y) = self._sprite(label)
+        x = int(label.origin[0]) - offset_x
+        y = int(label.origin[1]) - offset_y
+        height, width = image.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = min(x + sprite.shape[1], width)
+        y1 = min(y + sprite.shape[0], height)
+        if x1 <= x0 or y1 <= y0:
+            return
+        src = sprite[y0-y:y1-y, x0-x:x1-x]
+        if mask is None:
+            image[y0:y1, x0:x1] = src
+        else:
+            numpy.copyto(image[y0:y1, x0:x1], src, where=mask[y0-y:y1-y, x0-x:x1-x])
+
+    def _sprite(self, label):
+        """Return (sprite, mask or None, origin within the sprite)."""
+        key = label[:1] + label[2:]  # Everything but the position
+        cached = self._sprites.get(key)
+        if cached is not None:
+            self._sprites.move_to_end(key)
+            return cached
+
+        (text_w, text_h), baseline = cv2.getTextSize(
+            label.text, FONT, label.font_scale, TEXT_THICKNESS)
+        padding = LABEL_PADDING if label.background is not None else OUTLINE_THICKNESS
+        origin = (padding, text_h + padding)
+        shape = (text_h + 2 * padding + 1, text_w + 2 * padding + 1)
+        sprite = numpy.zeros(shape + (3,), numpy.uint8)
+        if label.background is not None:
+            sprite[:] = label.background
+            mask = None
+        else:
+            mask = numpy.zeros(shape + (1,), numpy.uint8)
+        for target, colour in ((sprite, label.outline_colour), (mask, (255,))):
+            if target is None:
+                continue
+            cv2.putText(target, label.text, origin, FONT, label.font_scale, colour,
+                        OUTLINE_THICKNESS, cv2.LINE_AA)
+        cv2.putText(sprite, label.text, origin, FONT, label.font_scale, label.colour,
+                    TEXT_THICKNESS, cv2.LINE_AA)
+        if mask is not None:
+            mask = mask > 0
+
+        cached = (sprite, mask, origin)
+        self._sprites[key] = cached
+        if len(self._sprites) > self.max_sprites:
+            self._sprites.popitem(last=False)
+        return cached
@@ -1,38 +1,257 @@
 #!/usr/bin/env python3
 
 
+import threading
+from collections import OrderedDict
+
 import cv2
 import numpy
 from jarvis.utils import helpers as utils
 
 
+# The intensity (0-100) at which every filter has its designed strength.
+# Lower intensities blend toward the unfiltered image, higher ones beyond.
+DEFAULT_INTENSITY = 50
+
+
+class _ScratchBuffers(threading.local):
+    """Scratch arrays private to each thread, keyed by name, shape and dtype.
+
+    Filters may be applied to several tiles of a frame at once (see
+    jarvis.utils.tiling), so intermediate images must not be shared
+    between threads. Tiles come in a few different shapes, hence the key.
+    """
+
+    # Forget everything past this many buffers, e.g. after resolution changes
+    MAX_BUFFERS = 12
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, shape, dtype = numpy.uint8):
+        key = (name, shape, numpy.dtype(dtype))
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            if len(self.buffers) >= self.MAX_BUFFERS:
+                self.buffers.clear()
+            buffer = numpy.empty(shape, dtype)
+            self.buffers[key] = buffer
+        return buffer
+
+
 def stroke_edges(src, dst, blur_k_size = 7, edges_k_size = 5):
+    """Darken the edges in a BGR image, like a pen stroke.
+
+    Works entirely in 8-bit: each channel is scaled by (255 - edges) / 255
+    with cv2.multiply, which rounds where the float version truncated, so
+    results may differ by 1. Scratch images are reused between calls (per
+    thread), so calls on same-sized frames allocate nothing.
+    """
+    gray_src = _stroke_edges_scratch.get('gray', src.shape[:2])
+    inverse_alpha = _stroke_edges_scratch.get('inverse_alpha', src.shape)
     if blur_k_size >= 3:
-        blurred_src = cv2.medianBlur(src, blur_k_size)
-        gray_src = cv2.cvtColor(blurred_src, cv2.COLOR_BGR2GRAY)
+        blurred = _stroke_edges_scratch.get('blurred', src.shape)
+        cv2.medianBlur(src, blur_k_size, blurred)
+        cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY, gray_src)
     else:
-        gray_src = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
+        cv2.cvtColor(src, cv2.COLOR_BGR2GRAY, gray_src)
     cv2.Laplacian(gray_src, cv2.CV_8U, gray_src, ksize = edges_k_size)
-    normalized_inverse_alpha = (1.0/255) * (255 - gray_src)
-    channels = cv2.split(src)
-    for channel in channels:
-        channel[:] = channel * normalized_inverse_alpha
-    cv2.merge(channels, dst)
+    # The inverse alpha as a 3-channel 8-bit image: 255 - edges
+    cv2.bitwise_not(gray_src, gray_src)
+    cv2.cvtColor(gray_src, cv2.COLOR_GRAY2BGR, inverse_alpha)
+    cv2.multiply(src, inverse_alpha, dst, scale = 1.0/255)
+
+
+def stroke_edges_halo(blur_k_size = 7, edges_k_size = 5):
+    """Return how many rows of context stroke_edges() reads around a row."""
+    blur_halo = blur_k_size // 2 if blur_k_size >= 3 else 0
+    # ksize 1 still uses a 3x3 aperture
+    return blur_halo + max(edges_k_size // 2, 1)
+
+
+_stroke_edges_scratch = _ScratchBuffers()
+
+
+class StrokeEdgesFilter:
+    """Darkens edges, like a pen stroke, by wrapping stroke_edges()."""
+    def __init__(self, blur_k_size = 7, edges_k_size = 5):
+        self._blur_k_size = blur_k_size
+        self._edges_k_size = edges_k_size
+
+    @property
+    def halo(self):
+        return stroke_edges_halo(self._blur_k_size, self._edges_k_size)
+
+    def apply(self, src, dst):
+        stroke_edges(src, dst, self._blur_k_size, self._edges_k_size)
+
+    def with_intensity(self, intensity):
+        """Return a variant whose blur and edge kernels grow with intensity.
+
+        The default intensity gives the default kernels (7 and 5), so
+        'edges' looks the same on its own and in a chain.
+        """
+        if intensity == DEFAULT_INTENSITY:
+            return self
+        blur_k_size = 3 + (intensity // 25) * 2  # Odd values 3-11
+        edges_k_size = 3 + (intensity // 50) * 2  # Odd values 3-7
+        return StrokeEdgesFilter(blur_k_size, edges_k_size)
 
 
 class VConvolutionFilter:
+    """Applies a kernel with cv2.filter2D or a cheaper, equivalent call.
+
+    The kernel is analysed once, at construction:
+    - a constant kernel that sums to 1 is a box blur (cv2.blur), whose
+      cost does not depend on the kernel size;
+    - a rank-1 kernel is separable into two 1D passes (cv2.sepFilter2D),
+      which OpenCV has a fast path for when both are symmetric or
+      antisymmetric; other 1D passes only beat filter2D from
+      MIN_SEPARABLE_SIZE up;
+    - a kernel that is a scaled identity plus a constant residual of
+      total weight at most MAX_BLUR_WEIGHT (e.g. an intensity-blended
+      blur) is a weighted sum of the source and its cv2.blur;
+    - a large kernel that is a scaled identity plus any other constant or
+      rank-1 residual (e.g. a sharpen) is computed as the residual
+      (cv2.boxFilter or cv2.sepFilter2D) plus a weighted copy of the
+      source;
+    - anything else uses a dense cv2.filter2D.
+    Fast paths match filter2D to within rounding (+/-1 for 8-bit images).
+
+    Every filter has a halo: the number of rows above and below an output
+    row that its value depends on, which a tiled caller must include
+    around each tile (see jarvis.utils.tiling).
+    """
+
+    # Below this size the identity-plus-residual path is slower than filter2D
+    MIN_RESIDUAL_SIZE = 7
+    # Up to this weight, blurring in 8 bits keeps identity-plus-blur within 1
+    MAX_BLUR_WEIGHT = 2.0
+    # Below this size asymmetric 1D passes are slower than filter2D
+    MIN_SEPARABLE_SIZE = 7
+
     def __init__(self, kernel):
         self._kernel = kernel
-    
+        self._mode, self._params = _analyse_kernel(
+            numpy.asarray(kernel, numpy.float64), self.MIN_RESIDUAL_SIZE,
+            self.MIN_SEPARABLE_SIZE, self.MAX_BLUR_WEIGHT)
+        self._scratch = _ScratchBuffers()
+
+    @property
+    def kernel(self):
+        return self._kernel
+
+    @property
+    def halo(self):
+        return numpy.shape(self._kernel)[0] // 2
+
+    @property
+    def mode(self):
+        """How the kernel is applied: 'box', 'separable', 'identity_blur',
+        'identity_box', 'identity_separable' or 'dense'."""
+        return self._mode
+
+    @property
+    def cost(self):
+        """A rough per-pixel cost of apply(), in kernel taps."""
+        h, w = numpy.shape(self._kernel)
+        if self._mode == 'box':
+            return 2  # A running sum, whatever the kernel size
+        if self._mode == 'separable':
+            return h + w
+        if self._mode == 'identity_blur':
+            return 4  # The box, plus a weighted sum with the source
+        if self._mode == 'identity_box':
+            return 10  # As above, but in float
+        if self._mode == 'identity_separable':
+            return h + w + 2
+        return h * w
+
     def apply(self, src, dst):
-        cv2.filter2D(src, -1, self._kernel, dst)
+        mode = self._mode
+        if mode == 'box':
+            cv2.blur(src, self._params, dst)
+        elif mode == 'separable':
+            kernel_x, kernel_y = self._params
+            cv2.sepFilter2D(src, -1, kernel_x, kernel_y, dst)
+        elif mode == 'identity_blur' and src.dtype == numpy.uint8:
+            identity_weight, blur_weight, k_size = self._params
+            blurred = src
+            if blur_weight:
+                blurred = self._scratch.get('blurred', src.shape)
+                cv2.blur(src, k_size, blurred)
+            cv2.addWeighted(src, identity_weight, blurred, blur_weight, 0.0, dst)
+        elif mode != 'dense' and src.dtype == numpy.uint8:
+            residual = self._scratch.get('residual', src.shape, numpy.float32)
+            if mode == 'identity_box':
+                identity_weight, residual_weight, k_size = self._params
+                cv2.boxFilter(src, cv2.CV_32F, k_size, residual, normalize=False)
+            else:
+                identity_weight, kernel_x, kernel_y = self._params
+                residual_weight = 1.0
+                cv2.sepFilter2D(src, cv2.CV_32F, kernel_x, kernel_y, residual)
+            cv2.addWeighted(src, identity_weight, residual, residual_weight, 0.0,
+                            dst, dtype=cv2.CV_8U)
+        else:
+            cv2.filter2D(src, -1, self._kernel, dst)
+
+    def can_compose(self, other):
+        """Whether this filter followed by another fuses into one kernel.
+
+        Applied one after the other, the filters round and clip the
+        intermediate image to 8 bits; the fused kernel doesn't. Only
+        averaging kernels (non-negative, summing to at most 1, like blurs)
+        are fused, as their intermediate can't leave the image's range and
+        rounding it isn't amplified, so the result is the same to within 1.
+        They are only fused when the fused kernel is no costlier than both
+        (see cost): two box blurs, for one, are cheaper than their fused
+        kernel.
+        """
+        return (isinstance(other, VConvolutionFilter) and
+                all(size % 2 == 1 for size in self._kernel.shape + other.kernel.shape) and
+                _is_averaging_kernel(self._kernel) and _is_averaging_kernel(other.kernel) and
+                self.compose(other).cost <= self.cost + other.cost)
+
+    def compose(self, other):
+        """Return one filter equivalent to applying this filter, then other.
+
+        The fused kernel is the full convolution of both kernels (see
+        can_compose() for when that matches running them in turn, and is
+        worth it).
+        """
+        kernel0 = numpy.asarray(self._kernel, numpy.float64)
+        kernel1 = numpy.asarray(other.kernel, numpy.float64)
+        h0, w0 = kernel0.shape
+        h1, w1 = kernel1.shape
+        kernel = numpy.zeros((h0 + h1 - 1, w0 + w1 - 1))
+        for (y, x), weight in numpy.ndenumerate(kernel1):
+            kernel[y:y+h0, x:x+w0] += weight * kernel0
+        return VConvolutionFilter(kernel)
+
+    def with_intensity(self, intensity):
+        """Return a variant with the kernel blended toward the identity.
+
+        The blend is baked into the kernel and applied in one pass where
+        possible: a blended blur is a weighted sum of the source and its box
+        blur, and intensity 0 a weighted copy.
+        """
+        if intensity == DEFAULT_INTENSITY:
+            return self
+        strength = intensity / float(DEFAULT_INTENSITY)
+        kernel = strength * numpy.asarray(self._kernel, numpy.float64)
+        h, w = kernel.shape
+        kernel[h // 2, w // 2] += 1.0 - strength
+        return VConvolutionFilter(kernel)
 
 
 class SharpenFilter(VConvolutionFilter):
-    def __init__(self):
-        kernel = numpy.array([[-1, -1, -1],
-                              [-1,  9, -1],
-                              [-1, -1, -1]])
+    def __init__(self, k_size = 3):
+        # With k_size 3:
+        # [[-1, -1, -1],
+        #  [-1,  9, -1],
+        #  [-1, -1, -1]]
+        kernel = -numpy.ones((k_size, k_size))
+        kernel[k_size // 2, k_size // 2] = k_size * k_size
         VConvolutionFilter.__init__(self, kernel)
 
 
@@ -45,15 +264,105 @@ class FindEdgesFilter(VConvolutionFilter):
 
 
 class BlurFilter(VConvolutionFilter):
-    def __init__(self):
-        kernel = numpy.array([[0.04, 0.04, 0.04, 0.04, 0.04],
-                              [0.04, 0.04, 0.04, 0.04, 0.04],
-                              [0.04, 0.04, 0.04, 0.04, 0.04],
-                              [0.04, 0.04, 0.04, 0.04, 0.04],
-                              [0.04, 0.04, 0.04, 0.04, 0.04]])
+    def __init__(self, k_size = 5):
+        # With k_size 5, every element is 0.04
+        kernel = numpy.full((k_size, k_size), 1.0 / (k_size * k_size))
         VConvolutionFilter.__init__(self, kernel)
 
 
+def _is_averaging_kernel(kernel):
+    """Whether a kernel's output stays within its input's range."""
+    kernel = numpy.asarray(kernel, numpy.float64)
+    return kernel.min() >= 0 and kernel.sum() <= 1.0 + 1e-9
+
+
+def _analyse_kernel(kernel, min_residual_size, min_separable_size, max_blur_weight):
+    """Return (mode, params) describing the cheapest exact way to apply a
+    kernel. See VConvolutionFilter."""
+    h, w = kernel.shape
+    tolerance = 1e-9 * max(numpy.abs(kernel).max(), 1.0)
+
+    if numpy.ptp(kernel) <= tolerance and abs(kernel.sum() - 1.0) <= tolerance * h * w:
+        return 'box', (w, h)
+
+    if h % 2 == 1 and w % 2 == 1:
+        centre_weight = kernel[h // 2, w // 2]
+        if numpy.abs(kernel).sum() - abs(centre_weight) <= tolerance:
+            # A scaled identity, e.g. a filter at intensity 0
+            return 'identity_blur', (centre_weight, 0.0, None)
+
+    separable = _separate_kernel(kernel, tolerance)
+    if separable is not None:
+        kernel_x, kernel_y, symmetric = separable
+        if symmetric or min(h, w) >= min_separable_size:
+            return 'separable', (kernel_x, kernel_y)
+
+    # Look for kernel = identity_weight * identity + residual, where the
+    # residual is rank-1. For a rank-1 residual the centre element is fixed
+    # by any off-centre element and the two elements in line with it.
+    if h % 2 == 0 or w % 2 == 0:
+        return 'dense', None
+    cy, cx = h // 2, w // 2
+    off_centre = numpy.abs(kernel).copy()
+    off_centre[cy, :] = 0
+    off_centre[:, cx] = 0
+    y, x = numpy.unravel_index(numpy.argmax(off_centre), kernel.shape)
+    if off_centre[y, x] <= tolerance:
+        return 'dense', None
+    residual = kernel.copy()
+    residual[cy, cx] = kernel[cy, x] * kernel[y, cx] / kernel[y, x]
+    identity_weight = kernel[cy, cx] - residual[cy, cx]
+    if numpy.ptp(residual) <= tolerance:
+        blur_weight = residual[0, 0] * h * w
+        if abs(blur_weight) <= max_blur_weight:
+            return 'identity_blur', (identity_weight, blur_weight, (w, h))
+    if min(h, w) < min_residual_size:
+        return 'dense', None
+    if numpy.ptp(residual) <= tolerance:
+        return 'identity_box', (identity_weight, residual[0, 0], (w, h))
+    separable = _separate_kernel(residual, tolerance)
+    if separable is not None:
+        return 'identity_separable', (identity_weight,) + separable[:2]
+    return 'dense', None
+
+
+def _separate_kernel(kernel, tolerance):
+    """Return (kernel_x, kernel_y, symmetric) if the kernel is the outer
+    product of kernel_y and kernel_x, else None.
+
+    The factors are the row and column through the kernel's largest
+    element, scaled alike, so a symmetric kernel gives symmetric factors.
+    They are float32, and made exactly symmetric (or antisymmetric) when
+    they are so to within tolerance, as sepFilter2D only takes its fast
+    path for exact ones; symmetric tells whether both are.
+    """
+    y, x = numpy.unravel_index(numpy.argmax(numpy.abs(kernel)), kernel.shape)
+    pivot = kernel[y, x]
+    if abs(pivot) <= tolerance:
+        return None
+    scale = numpy.sqrt(abs(pivot))
+    kernel_x = kernel[y, :] * (numpy.sign(pivot) / scale)
+    kernel_y = kernel[:, x] / scale
+    if numpy.abs(numpy.outer(kernel_y, kernel_x) - kernel).max() > tolerance:
+        return None
+    kernel_x, symmetric_x = _symmetrise(kernel_x, tolerance)
+    kernel_y, symmetric_y = _symmetrise(kernel_y, tolerance)
+    return kernel_x, kernel_y, symmetric_x and symmetric_y
+
+
+def _symmetrise(factor, tolerance):
+    """Return (factor as float32, whether it is symmetric or antisymmetric),
+    making it exactly so if it is to within tolerance."""
+    reverse = factor[::-1]
+    if numpy.abs(factor - reverse).max() <= tolerance:
+        factor = (factor + reverse) / 2
+    elif numpy.abs(factor + reverse).max() <= tolerance:
+        factor = (factor - reverse) / 2
+    else:
+        return factor.astype(numpy.float32), False
+    return factor.astype(numpy.float32), True
+
+
 class EmbossFilter(VConvolutionFilter):
     def __init__(self):
         kernel = numpy.array([[-2, -1, 0],
@@ -62,40 +371,69 @@ class EmbossFilter(VConvolutionFilter):
         VConvolutionFilter.__init__(self, kernel)
 
 
-class BGRFuncFilter:
+class BGRLookupFilter:
+    """Maps each BGR channel through a (256, 1, 3) uint8 lookup table."""
+    def __init__(self, lookup_table):
+        self._lookup_table = lookup_table
+
+    @property
+    def lookup_table(self):
+        return self._lookup_table
+
+    @property
+    def halo(self):
+        return 0
+
+    def apply(self, src, dst):
+        """Apply the filter with a BGR source/destination."""
+        cv2.LUT(src, self._lookup_table, dst)
+
+    def can_compose(self, other):
+        """Whether this filter followed by another fuses into one table."""
+        return isinstance(other, BGRLookupFilter)
+
+    def compose(self, other):
+        """Return one filter equivalent to applying this filter, then other."""
+        first = self._lookup_table
+        second = other.lookup_table
+        channels = numpy.arange(first.shape[2])
+        return BGRLookupFilter(second[first, 0, channels])
+
+    def with_intensity(self, intensity):
+        """Return a variant with the table blended toward the identity."""
+        if intensity == DEFAULT_INTENSITY:
+            return self
+        strength = intensity / float(DEFAULT_INTENSITY)
+        identity = numpy.arange(len(self._lookup_table), dtype=numpy.float64)
+        identity = identity.reshape(-1, 1, 1)
+        table = identity + strength * (self._lookup_table - identity)
+        return BGRLookupFilter(
+            numpy.clip(numpy.rint(table), 0, 255).astype(numpy.uint8))
+
+
+class BGRFuncFilter(BGRLookupFilter):
     def __init__(self, v_func = None, b_func = None, g_func = None,
                  r_func = None):
         self._v_func = v_func
         self._b_func = b_func
         self._g_func = g_func
         self._r_func = r_func
-        
-        self._v_lookup_array = utils.create_lookup_array(v_func)
-        self._b_lookup_array = utils.create_lookup_array(b_func)
-        self._g_lookup_array = utils.create_lookup_array(g_func)
-        self._r_lookup_array = utils.create_lookup_array(r_func)
-    
-    def apply(self, src, dst):
-        """Apply the filter with a BGR source/destination."""
-        b, g, r = cv2.split(src)
-        if self._b_lookup_array is not None:
-            utils.apply_lookup_array(self._b_lookup_array, b, b)
-        if self._g_lookup_array is not None:
-            utils.apply_lookup_array(self._g_lookup_array, g, g)
-        if self._r_lookup_array is not None:
-            utils.apply_lookup_array(self._r_lookup_array, r, r)
-        cv2.merge([b, g, r], dst)
+
+        # Compose the overall (violet) curve into each channel's curve and
+        # bake all three into one table, so a frame is a single cv2.LUT
+        BGRLookupFilter.__init__(self, utils.create_bgr_lookup_table(
+            utils.create_composite_func(b_func, v_func),
+            utils.create_composite_func(g_func, v_func),
+            utils.create_composite_func(r_func, v_func)))
 
 
-class BGRCurveFilter(BGRFuncFilter):
+class BGRCurveFilter(BGRLookupFilter):
     def __init__(self, v_points = None, b_points = None,
                  g_points = None, r_points = None):
-        v_func = utils.create_curve_func(v_points)
-        b_func = utils.create_curve_func(b_points)
-        g_func = utils.create_curve_func(g_points)
-        r_func = utils.create_curve_func(r_points)
-        
-        BGRFuncFilter.__init__(self, v_func, b_func, g_func, r_func)
+        # Equivalent to a BGRFuncFilter of the curve functions, but the
+        # table is cached on disk by control points
+        BGRLookupFilter.__init__(self, utils.create_curve_lookup_table(
+            v_points, b_points, g_points, r_points))
 
 
 class BGRCrossProcessCurveFilter(BGRCurveFilter):
@@ -151,4 +489,122 @@ class BGRVelviaCurveFilter(BGRCurveFilter):
             # Green curve.
             [(0, 0), (85, 98), (189, 216), (255, 255)],
             # Red curve.
-            [(0, 0), (86, 73), (175, 180), (255, 255)])
\ No newline at end of file
+            [(0, 0), (86, 73), (175, 180), (255, 255)])
+
+
+def create_default_filters():
+    """Return a dict of the filters offered in the UI, keyed by filter ID.
+
+    'none' maps to None, meaning the frame is left unfiltered.
+    """
+    return {
+        'none': None,
+        'edges': StrokeEdgesFilter(),
+        'sharpen': SharpenFilter(),
+        'blur': BlurFilter(),
+        'emboss': EmbossFilter(),
+        'cross_process': BGRCrossProcessCurveFilter(),
+        'portra': BGRPortraCurveFilter(),
+        'provia': BGRProviaCurveFilter(),
+        'velvia': BGRVelviaCurveFilter()
+    }
+
+
+def fuse_filters(filters):
+    """Return the steps needed to apply filters in order, with adjacent
+    fusable filters (curves into one lookup table, linear convolutions
+    into one kernel) combined into single steps.
+    """
+    steps = []
+    for filter_obj in filters:
+        if filter_obj is None:
+            continue
+        sub_steps = filter_obj.steps if isinstance(filter_obj, FilterPipeline) else [filter_obj]
+        for step in sub_steps:
+            previous = steps[-1] if steps else None
+            if previous is not None and hasattr(previous, 'can_compose') and previous.can_compose(step):
+                steps[-1] = previous.compose(step)
+            else:
+                steps.append(step)
+    return steps
+
+
+class FilterPipeline:
+    """Applies a chain of filters, fusing what can be fused.
+
+    Non-fusable steps run one after the other, alternating between two
+    intermediate buffers that are reused from frame to frame (per thread).
+    """
+    def __init__(self, filters):
+        self._filters = list(filters)
+        self._steps = fuse_filters(self._filters)
+        self._scratch = _ScratchBuffers()
+
+    @property
+    def filters(self):
+        return self._filters
+
+    @property
+    def steps(self):
+        return self._steps
+
+    @property
+    def halo(self):
+        """The sum of the steps' halos, or None if any step has none."""
+        halos = [getattr(step, 'halo', None) for step in self._steps]
+        if None in halos:
+            return None
+        return sum(halos)
+
+    def apply(self, src, dst):
+        if not self._steps:
+            if src is not dst:
+                dst[:] = src
+            return
+        last = len(self._steps) - 1
+        current = src
+        for i, step in enumerate(self._steps):
+            if i == last:
+                out = dst
+            else:
+                out = self._scratch.get(i % 2, src.shape, src.dtype)
+            step.apply(current, out)
+            current = out
+
+    def with_intensity(self, intensity):
+        """Return a pipeline with every filter at the given intensity."""
+        if intensity == DEFAULT_INTENSITY:
+            return self
+        return FilterPipeline([filter_obj.with_intensity(intensity)
+                               for filter_obj in self._filters])
+
+
+class FilterVariantCache:
+    """A small LRU of filter variants keyed by (filter_id, intensity).
+
+    Variants are built on first use from the base filter returned by
+    get_filter(filter_id), so dragging an intensity slider back and forth
+    reuses the same variants instead of rebuilding them every frame.
+    """
+    def __init__(self, get_filter, max_size = 16):
+        self._get_filter = get_filter
+        self._max_size = max_size
+        self._variants = OrderedDict()
+
+    def get(self, filter_id, intensity):
+        key = (filter_id, intensity)
+        variant = self._variants.get(key)
+        if variant is not None:
+            self._variants.move_to_end(key)
+            return variant
+        base = self._get_filter(filter_id)
+        if base is None:
+            return None
+        variant = base.with_intensity(intensity)
+        self._variants[key] = variant
+        if len(self._variants) > self._max_size:
+            self._variants.popitem(last=False)
+        return variant
+
+    def clear(self):
+        self._variants.clear()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
 
+import hashlib
+import json
+import os
+
 import cv2
 import numpy
-import scipy.interpolate
 
 
 # Modern screen resolution function using PyQt5
@@ -73,13 +76,14 @@ def create_lookup_array(func, length=256):
     """
     if func is None:
         return None
-    lookup_array = numpy.empty(length)
-    i = 0
-    while i < length:
-        func_i = func(i)
-        lookup_array[i] = min(max(0, func_i), length - 1)
-        i += 1
-    return lookup_array
+    inputs = numpy.arange(length)
+    lookup_array = numpy.asarray(func(inputs), dtype=numpy.float64)
+    if lookup_array.shape != inputs.shape:
+        # The function only accepts scalars
+        lookup_array = numpy.array([func(i) for i in inputs], dtype=numpy.float64)
+    # Undefined (NaN) values map to 0, as they always have
+    lookup_array = numpy.nan_to_num(lookup_array, nan=0.0)
+    return numpy.clip(lookup_array, 0, length - 1)
 
 
 def apply_lookup_array(lookup_array, src, dst):
@@ -89,8 +93,75 @@ def apply_lookup_array(lookup_array, src, dst):
     dst[:] = lookup_array[src]
 
 
+def create_bgr_lookup_table(b_func, g_func, r_func, length=256):
+    """Return a (length, 1, 3) uint8 table for applying per-channel functions
+    to a BGR image with a single cv2.LUT call.
+
+    Channels without a function map to themselves.
+    """
+    table = numpy.empty((length, 1, 3), numpy.uint8)
+    for channel, func in enumerate((b_func, g_func, r_func)):
+        lookup_array = create_lookup_array(func, length)
+        if lookup_array is None:
+            table[:, 0, channel] = numpy.arange(length)
+        else:
+            # Truncate like assigning the float lookup to a uint8 image does
+            table[:, 0, channel] = lookup_array
+    return table
+
+
+# Bump when the way curve tables are built changes, to invalidate the cache
+LOOKUP_TABLE_CACHE_VERSION = 1
+
+
+def create_curve_lookup_table(v_points, b_points, g_points, r_points,
+                              length=256):
+    """Return a (length, 1, 3) uint8 table for BGR curves given by control
+    points, with the overall (v) curve composed into each channel's curve.
+
+    Tables are cached on disk, keyed by the control points, so SciPy is
+    only needed the first time a cubic curve is seen.
+    """
+    key = json.dumps([LOOKUP_TABLE_CACHE_VERSION, length,
+                      v_points, b_points, g_points, r_points])
+    file_name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npy'
+    try:
+        cache_path = os.path.join(get_cache_dir('lookup_tables'), file_name)
+    except OSError:
+        cache_path = None
+
+    if cache_path is not None:
+        try:
+            table = numpy.load(cache_path)
+            if table.shape == (length, 1, 3) and table.dtype == numpy.uint8:
+                return table
+        except (OSError, ValueError):
+            pass
+
+    v_func = create_curve_func(v_points)
+    table = create_bgr_lookup_table(
+        create_composite_func(create_curve_func(b_points), v_func),
+        create_composite_func(create_curve_func(g_points), v_func),
+        create_composite_func(create_curve_func(r_points), v_func),
+        length)
+
+    if cache_path is not None:
+        try:
+            tmp_path = cache_path + '.tmp.npy'
+            numpy.save(tmp_path, table)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # A read-only cache just means building the table next time too
+            pass
+    return table
+
+
 def create_curve_func(points):
-    """Return a function derived from control points."""
+    """Return a function derived from control points.
+
+    Like scipy.interpolate.interp1d(bounds_error=False), the function
+    returns NaN outside the range of the control points.
+    """
     if points is None:
         return None
     num_points = len(points)
@@ -98,12 +169,12 @@ def create_curve_func(points):
         return None
     xs, ys = zip(*points)
     if num_points < 4:
-        kind = 'linear'
         # 'quadratic' is not implemented.
-    else:
-        kind = 'cubic'
-    return scipy.interpolate.interp1d(xs, ys, kind,
-                                  bounds_error = False)
+        return lambda x: numpy.interp(x, xs, ys, left=numpy.nan, right=numpy.nan)
+    # SciPy is slow to import, so only load it for cubic curves
+    import scipy.interpolate
+    return scipy.interpolate.interp1d(xs, ys, 'cubic',
+                                      bounds_error = False)
 
 
 def create_composite_func(func0, func1):
@@ -115,6 +186,20 @@ def create_composite_func(func0, func1):
     return lambda x: func0(func1(x))
 
 
+def get_cache_dir(*subdirs):
+    """Return (and create) a directory for Jarvis' on-disk caches.
+
+    The root defaults to ~/.cache/jarvis and can be overridden with the
+    JARVIS_CACHE_DIR environment variable.
+    """
+    root = os.environ.get('JARVIS_CACHE_DIR')
+    if not root:
+        root = os.path.join(os.path.expanduser('~'), '.cache', 'jarvis')
+    cache_dir = os.path.join(root, *subdirs)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
 def is_gray(image):
     """Return True if the image has one channel per pixel."""
     return image.ndim < 3
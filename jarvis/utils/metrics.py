@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""
+Counters, gauges and latency histograms, served as Prometheus text.
+
+Metrics are created once, at module level, by the code they measure:
+
+    FRAMES = metrics.counter('jarvis_frames_total', "Frames processed")
+    FRAMES.inc()
+
+    with metrics.stage('filter'):
+        ...
+
+and every web stream serves the whole registry on its /metrics path.
+Stages are also recorded as spans by jarvis.utils.tracing.
+"""
+
+import bisect
+import threading
+import time
+
+from jarvis.utils import tracing
+
+
+# Upper bounds (in seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0)
+
+
+class _Metric:
+    """A metric family: one value per combination of label values."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        self._function = None
+        if not self.labelnames:
+            # Reported as zero until first updated
+            self.labels()
+
+    def labels(self, *values):
+        """Return the child for a combination of label values."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def remove(self, *values):
+        """Forget a child, e.g. the stats of a client that disconnected."""
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def set_function(self, function):
+        """Report function()'s return value when scraped (unlabelled metrics only)."""
+        self._function = function
+
+    def _default(self):
+        return self.labels()
+
+    def samples(self):
+        """Yield (suffix, label pairs, value) for each sample."""
+        if self._function is not None:
+            yield '', (), self._function()
+            return
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            labels = tuple(zip(self.labelnames, values))
+            for suffix, extra_labels, value in child.samples():
+                yield suffix, labels + extra_labels, value
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield '', (), self.value
+
+
+class Counter(_Metric):
+    """A total that only goes up, e.g. frames encoded."""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. connected clients."""
+
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().inc(-amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Return a context manager that observes how long its block took."""
+        return _Timer(self.observe)
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield '_bucket', (('le', _format_value(bound)),), cumulative
+        yield '_sum', (), total
+        yield '_count', (), cumulative
+
+
+class Histogram(_Metric):
+    """Counts of observations (e.g. latencies) in cumulative buckets."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class _Timer:
+    def __init__(self, observe):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._observe(time.perf_counter() - self._start)
+
+
+class MetricsRegistry:
+    """A set of metrics, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        """Add a metric, or return the one already registered under its name."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"{metric.name} is already a {existing.type_name}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        """Return every metric as Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation, False)}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for suffix, labels, value in metric.samples():
+                label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+                if label_text:
+                    label_text = '{' + label_text + '}'
+                lines.append(f"{metric.name}{suffix}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# The registry that the web streams serve
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Latency of each stage of the frame pipeline, labelled by stage
+STAGE_SECONDS = histogram('jarvis_stage_seconds',
+                          "Time spent in each stage of the frame pipeline", ['stage'])
+
+# Time from a frame's capture until it reaches an output
+FRAME_AGE_SECONDS = histogram('jarvis_frame_age_seconds',
+                              "Age of frames when they reach an output "
+                              "(display, stream or recorder)", ['output'])
+
+
+def stage(name, frame=None):
+    """
+    Return a context manager timing a pipeline stage.
+
+    Args:
+        name: capture, mirror, detect, features, track, filter, anonymize,
+            annotate, encode, render, write or record
+        frame: The frame the stage works on, whose capture_time (if it has
+            one) is recorded with the span
+    """
+    return _StageTimer(name, frame)
+
+
+def record_stage(name, start, end, capture_time=None):
+    """
+    Record that a stage ran from start to end.
+
+    Args:
+        name: Stage name (see stage())
+        start: time.perf_counter() when the stage started
+        end: time.perf_counter() when it ended
+        capture_time: time.perf_counter() when the stage's frame was captured
+    """
+    STAGE_SECONDS.labels(name).observe(end - start)
+    tracing.record(name, start, end, capture_time)
+
+
+def observe_frame_age(output, capture_time):
+    """Record the age of a frame reaching an output, if its capture time is known."""
+    if capture_time is not None:
+        FRAME_AGE_SECONDS.labels(output).observe(time.perf_counter() - capture_time)
+
+
+class _StageTimer:
+    def __init__(self, name, frame):
+        self.name = name
+        self.frame = frame
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.name, self.start, time.perf_counter(),
+                     getattr(self.frame, 'capture_time', None))
+
+
+def _escape(text, quotes=True):
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quotes else text
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
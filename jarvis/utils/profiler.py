@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+A sampling profiler that can be switched on in a running process.
+
+cProfile only sees the thread it is enabled on, and slows down every call
+it sees. StackSampler instead wakes up every few milliseconds, records the
+Python stack of every thread (sys._current_frames()), and counts how often
+each stack was seen. The counts are written in the collapsed-stack format
+("thread;outer;...;inner count" per line) read by flamegraph.pl,
+speedscope (https://www.speedscope.app) and similar tools.
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class StackSampler:
+    """Samples the stacks of all threads for a while, then writes them to a file."""
+
+    def __init__(self, interval=0.01):
+        """
+        Initialize the sampler.
+
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.path = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, path, duration=None):
+        """
+        Start sampling on a background thread.
+
+        Args:
+            path: File the collapsed stacks are written to when sampling stops
+            duration: Seconds after which sampling stops by itself (None to
+                sample until stop() is called)
+        """
+        if self.is_running:
+            raise RuntimeError("The sampler is already running")
+        self.path = path
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(path, duration),
+                                        name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """Stop sampling and write the file (waiting until it's written, if wait)."""
+        thread = self._thread
+        self._stop_event.set()
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, path, duration):
+        own_id = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + duration if duration is not None else None
+        while not self._stop_event.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks[_collapse(thread_names.get(thread_id, str(thread_id)), frame)] += 1
+            samples += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+        with open(path, 'w') as profile_file:
+            for stack, count in stacks.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        logging.info(f"Profile of {samples} samples over "
+                     f"{time.perf_counter() - start:.1f}s saved to {path}")
+
+
+def _collapse(thread_name, frame):
+    """Return a stack as 'thread;outermost;...;innermost'."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f"{module}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    names.append(thread_name.replace(';', ':'))
+    return ';'.join(reversed(names)).replace(' ', '_')
@@ -55,4 +55,30 @@ def swap_rects(src, dst, rects,
     
     # Copy the first ROI to the second position from the temp copy
     dst[y2:y2+h2, x2:x2+w2] = cv2.resize(
-        temp, (w2, h2), interpolation=interpolation)
\ No newline at end of file
+        temp, (w2, h2), interpolation=interpolation)
+
+
+def intersection_over_union(rect0, rect1):
+    """Return the overlap of two (x, y, w, h) rectangles, from 0.0 to 1.0."""
+    x0, y0, w0, h0 = rect0
+    x1, y1, w1, h1 = rect1
+    overlap_w = min(x0 + w0, x1 + w1) - max(x0, x1)
+    overlap_h = min(y0 + h0, y1 + h1) - max(y0, y1)
+    if overlap_w <= 0 or overlap_h <= 0:
+        return 0.0
+    intersection = overlap_w * overlap_h
+    return intersection / float(w0 * h0 + w1 * h1 - intersection)
+
+
+def clip_rect(rect, image):
+    """Clip an (x, y, w, h) rectangle to an image's bounds.
+
+    Returns None if nothing of the rectangle is inside the image.
+    """
+    x, y, w, h = rect
+    height, width = image.shape[:2]
+    x0, y0 = max(int(x), 0), max(int(y), 0)
+    x1, y1 = min(int(x + w), width), min(int(y + h), height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
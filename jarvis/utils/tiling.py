@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Tile-parallel execution of image filters.
+
+Large frames are split into horizontal strips that are filtered on a
+thread pool; OpenCV and NumPy release the GIL while they work, so the
+strips really do run at the same time. Each strip is read together with
+the rows of context (the filter's halo) its output depends on, so the
+result is the same as filtering the whole frame at once.
+"""
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+
+# How long one tile took, for finding slow filters and load imbalance
+TileTiming = namedtuple('TileTiming', ['index', 'start_row', 'stop_row', 'seconds'])
+
+
+class TileExecutor:
+    """
+    Applies filters to frames in parallel, one horizontal strip per task.
+
+    A filter can be tiled if it has a halo attribute: the number of rows
+    above and below an output row that the row's value depends on (0 for
+    per-pixel filters such as lookup tables). Filters without one, and
+    frames shorter than min_height, are applied to the whole frame on the
+    calling thread.
+
+    Strips write straight into the shared output buffer. When a filter
+    with a halo works in place, the source is first copied so that no
+    strip reads rows another strip has already overwritten.
+    """
+
+    def __init__(self, num_workers=None, min_height=1080, min_tile_rows=64):
+        """
+        Initialize the executor.
+
+        Args:
+            num_workers: Number of threads (defaults to the number of CPUs)
+            min_height: Frames with fewer rows are not tiled
+            min_tile_rows: Minimum number of output rows per tile
+        """
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.min_height = min_height
+        self.min_tile_rows = min_tile_rows
+        self.last_timings = []
+        self._pool = None
+        self._source_copy = None
+        self._tile_outputs = {}
+
+    def apply(self, filter_obj, src, dst):
+        """
+        Apply a filter to src, writing the result into dst.
+
+        Args:
+            filter_obj: Any object with apply(src, dst)
+            src: Source image
+            dst: Destination image of the same shape (may be src)
+
+        Returns:
+            The per-tile timings, also kept in last_timings
+        """
+        height = src.shape[0]
+        halo = getattr(filter_obj, 'halo', None)
+        tile_count = min(self.num_workers, height // self.min_tile_rows)
+        if halo is None or height < self.min_height or tile_count < 2:
+            start = time.perf_counter()
+            filter_obj.apply(src, dst)
+            self.last_timings = [
+                TileTiming(0, 0, height, time.perf_counter() - start)]
+            return self.last_timings
+
+        if halo > 0 and numpy.shares_memory(src, dst):
+            if self._source_copy is None or self._source_copy.shape != src.shape \
+                    or self._source_copy.dtype != src.dtype:
+                self._source_copy = numpy.empty_like(src)
+            numpy.copyto(self._source_copy, src)
+            src = self._source_copy
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.num_workers,
+                                            thread_name_prefix='tile')
+        bounds = numpy.linspace(0, height, tile_count + 1).astype(int)
+        futures = [self._pool.submit(self._apply_tile, filter_obj, src, dst, halo,
+                                     index, bounds[index], bounds[index + 1])
+                   for index in range(tile_count)]
+        self.last_timings = [future.result() for future in futures]
+        return self.last_timings
+
+    def _apply_tile(self, filter_obj, src, dst, halo, index, start_row, stop_row):
+        """Filter rows start_row to stop_row; return their TileTiming."""
+        start = time.perf_counter()
+        if halo == 0:
+            filter_obj.apply(src[start_row:stop_row], dst[start_row:stop_row])
+        else:
+            # Filter the strip with its halo into this tile's own buffer,
+            # then copy back only the rows this tile is responsible for
+            top = max(start_row - halo, 0)
+            bottom = min(stop_row + halo, src.shape[0])
+            window = src[top:bottom]
+            out = self._tile_outputs.get(index)
+            if out is None or out.shape != window.shape or out.dtype != window.dtype:
+                out = numpy.empty_like(window)
+                self._tile_outputs[index] = out
+            filter_obj.apply(window, out)
+            dst[start_row:stop_row] = out[start_row - top:stop_row - top]
+        return TileTiming(index, int(start_row), int(stop_row),
+                          time.perf_counter() - start)
+
+    def close(self):
+        """Stop the worker threads."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+A ring buffer of pipeline spans, exported as Chrome trace JSON.
+
+Every stage timed with jarvis.utils.metrics.stage() is also recorded here
+as a span: (stage, start, end, thread, capture time of the frame). Load a
+dump in chrome://tracing or https://ui.perfetto.dev to see, thread by
+thread, where each frame spent its time; each span's args give the age of
+its frame, so a latency spike can be traced back to the stage that caused
+it.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+
+
+class SpanRecorder:
+    """
+    Keeps the most recent spans in a fixed-size ring buffer.
+
+    Recording takes no lock: the slot index comes from an itertools.count
+    and the span is stored with a single list assignment, both atomic under
+    the GIL, so pipeline threads never wait on each other (or on a dump).
+    """
+
+    def __init__(self, capacity=32768):
+        self.capacity = capacity
+        self._spans = [None] * capacity
+        self._next_index = itertools.count()
+
+    def record(self, name, start, end, capture_time=None):
+        """
+        Record a span.
+
+        Args:
+            name: Stage name
+            start: time.perf_counter() when the stage started
+            end: time.perf_counter() when it ended
+            capture_time: time.perf_counter() when the stage's frame was
+                captured, if known
+        """
+        self._spans[next(self._next_index) % self.capacity] = (
+            name, start, end, threading.get_ident(), capture_time)
+
+    def spans(self, seconds=None):
+        """Return the recorded spans (those ending in the last seconds, if given), oldest first."""
+        spans = [span for span in list(self._spans) if span is not None]
+        if seconds is not None:
+            since = time.perf_counter() - seconds
+            spans = [span for span in spans if span[2] >= since]
+        spans.sort(key=lambda span: span[1])
+        return spans
+
+    def chrome_trace(self, seconds=None):
+        """Return the spans as a Chrome trace (a JSON-serialisable dict)."""
+        pid = os.getpid()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        events = []
+        thread_ids = set()
+        for name, start, end, thread_id, capture_time in self.spans(seconds):
+            args = {}
+            if capture_time is not None:
+                args['capture_ms'] = round(capture_time * 1e3, 3)
+                args['frame_age_ms'] = round((end - capture_time) * 1e3, 3)
+            events.append({
+                'name': name, 'cat': 'pipeline', 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                'ts': start * 1e6, 'dur': (end - start) * 1e6, 'args': args,
+            })
+            thread_ids.add(thread_id)
+        for thread_id in thread_ids:
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id,
+                'args': {'name': thread_names.get(thread_id, str(thread_id))},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path, seconds=None):
+        """
+        Write the spans of the last seconds (or all of them) to a Chrome
+        trace file.
+
+        Returns:
+            The number of spans written
+        """
+        trace = self.chrome_trace(seconds)
+        with open(path, 'w') as trace_file:
+            json.dump(trace, trace_file)
+        return sum(1 for event in trace['traceEvents'] if event['ph'] == 'X')
+
+
+# The spans recorded by metrics.stage()
+SPANS = SpanRecorder()
+
+
+def record(name, start, end, capture_time=None):
+    SPANS.record(name, start, end, capture_time)
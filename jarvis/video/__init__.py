@@ -1,3 +1,17 @@
 """Video handling and processing modules."""
-from jarvis.video.streams import DummyStream, WebcamVideoStream, ThreadedWebStream
-from jarvis.video.recorder import VideoRecorder
+
+_EXPORTS = {
+    'FramePool': 'jarvis.video.frame_pool',
+    'DummyStream': 'jarvis.video.streams',
+    'WebcamVideoStream': 'jarvis.video.streams',
+    'ThreadedWebStream': 'jarvis.video.streams',
+    'VideoRecorder': 'jarvis.video.recorder',
+}
+
+
+def __getattr__(name):
+    # Imported on first use, like the other jarvis packages
+    if name in _EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
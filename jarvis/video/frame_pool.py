@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+A pool of reusable frame buffers.
+
+At 4K a frame is 24 MB, and allocating a few of them per frame (the
+processed copy, the mirrored camera frame, ...) costs more than some of the
+work done on them. Stages lease buffers from a FramePool instead, and hand
+them back when the frame is retired.
+
+Buffers are reference counted: whoever keeps a leased frame (e.g. a stream
+publishing it) calls retain(), and everyone calls release() when done with
+it. A buffer whose count drops to zero is retired, but it is only handed
+out again once nothing else in the process still refers to it - so a frame
+that escaped the accounting (an HTTP thread still encoding it, a view of it
+kept somewhere) is never overwritten under its reader.
+
+Pooled buffers are Frames: arrays that carry the time their frame was
+captured through every stage, for latency metrics and tracing.
+"""
+
+import sys
+import threading
+import weakref
+
+import numpy
+
+
+class Frame(numpy.ndarray):
+    """
+    A numpy array with the time.perf_counter() at which its frame was
+    captured (None if unknown). Views and copies keep the capture time.
+    """
+
+    capture_time = None
+
+    def __array_finalize__(self, obj):
+        self.capture_time = getattr(obj, 'capture_time', None)
+
+
+def _measure_idle_refcount():
+    """The reference count of a retired buffer that nothing else holds."""
+    retired = [numpy.empty(1)]
+    return sys.getrefcount(retired[0])
+
+
+class FramePool:
+    """Leases numpy buffers keyed by shape and dtype, reusing retired ones."""
+
+    # sys.getrefcount() of a buffer referenced only by the pool's free list
+    IDLE_REFCOUNT = _measure_idle_refcount()
+
+    def __init__(self, max_free=4):
+        """
+        Initialize the pool.
+
+        Args:
+            max_free: Most retired buffers kept per shape and dtype; any
+                more are left to the garbage collector
+        """
+        self.max_free = max_free
+        self._lock = threading.Lock()
+        self._free = {}  # (shape, dtype) -> retired buffers
+        self._counts = {}  # id(buffer) -> reference count, while leased
+        self._owned = weakref.WeakValueDictionary()  # id(buffer) -> buffer
+
+        self.leases = 0
+        self.hits = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+
+    def lease(self, shape, dtype=numpy.uint8):
+        """
+        Return a Frame with a reference count of one and no capture time.
+        Its contents are undefined.
+
+        Args:
+            shape: Shape of the buffer, e.g. frame.shape
+            dtype: numpy dtype of the buffer
+        """
+        key = (tuple(shape), numpy.dtype(dtype))
+        with self._lock:
+            self.leases += 1
+            buffer = None
+            retired = self._free.get(key)
+            if retired:
+                for i in range(len(retired)):
+                    if sys.getrefcount(retired[i]) <= self.IDLE_REFCOUNT:
+                        buffer = retired.pop(i)
+                        break
+            if buffer is None:
+                buffer = Frame(key[0], key[1])
+                self.allocations += 1
+                self.allocated_bytes += buffer.nbytes
+                self._owned[id(buffer)] = buffer
+                if len(self._counts) > 2 * len(self._owned):
+                    self._forget_collected()
+            else:
+                self.hits += 1
+            self._counts[id(buffer)] = 1
+        buffer.capture_time = None
+        return buffer
+
+    def lease_like(self, frame):
+        """
+        Return a buffer with the shape, dtype and capture time of frame
+        (see lease()). Its contents are undefined.
+        """
+        buffer = self.lease(frame.shape, frame.dtype)
+        buffer.capture_time = getattr(frame, 'capture_time', None)
+        return buffer
+
+    def owns(self, buffer):
+        """Whether buffer was leased from this pool and hasn't been retired."""
+        with self._lock:
+            return self._is_leased(buffer)
+
+    def retain(self, buffer):
+        """Add a reference to a leased buffer."""
+        with self._lock:
+            if not self._is_leased(buffer):
+                raise ValueError("Buffer is not leased from this pool")
+            self._counts[id(buffer)] += 1
+
+    def release(self, buffer):
+        """
+        Drop a reference to a leased buffer, retiring it when none are left.
+
+        Raises:
+            ValueError: If buffer isn't leased from this pool
+        """
+        with self._lock:
+            if not self._is_leased(buffer):
+                raise ValueError("Buffer is not leased from this pool")
+            count = self._counts[id(buffer)] - 1
+            if count > 0:
+                self._counts[id(buffer)] = count
+                return
+            del self._counts[id(buffer)]
+            retired = self._free.setdefault((buffer.shape, buffer.dtype), [])
+            if len(retired) < self.max_free:
+                retired.append(buffer)
+
+    def stats(self):
+        """Return the pool's counters, for logging and metrics."""
+        with self._lock:
+            return {
+                'leases': self.leases,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.leases if self.leases else 0.0,
+                'allocations': self.allocations,
+                'allocated_bytes': self.allocated_bytes,
+                'leased': len(self._counts),
+                'free': sum(len(retired) for retired in self._free.values()),
+            }
+
+    def clear(self):
+        """Drop every retired buffer."""
+        with self._lock:
+            self._free.clear()
+
+    def _is_leased(self, buffer):
+        return (id(buffer) in self._counts
+                and self._owned.get(id(buffer)) is buffer)
+
+    def _forget_collected(self):
+        """Drop the counts of leased buffers that were garbage collected."""
+        for buffer_id in [buffer_id for buffer_id in self._counts
+                          if buffer_id not in self._owned]:
+            del self._counts[buffer_id]
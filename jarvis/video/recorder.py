@@ -8,12 +8,23 @@ from threading import Thread, Lock
 import cv2
 import numpy
 
+from jarvis.utils import metrics
+
+
+RECORDER_FPS = metrics.gauge('jarvis_recorder_fps', "Frames per second read by the video recorder")
+FRAMES_RECORDED = metrics.counter('jarvis_recorder_frames_written_total',
+                                  "Frames written to the screencast video")
+
 
 class VideoRecorder(Thread):
     """
     Records frames from a video stream to image files or video files.
-    Works with any source that has a read() method returning video frames.
+    Works with any source that has a read() method returning video frames;
+    sources with a sequence counter are only read when they have a new one.
     """
+    # How long to wait before checking again for a new frame
+    POLL_INTERVAL = 0.005
+
     def __init__(self, source, should_mirror=False):
         """
         Initialize the video recorder.
@@ -22,7 +33,7 @@ class VideoRecorder(Thread):
             source: A video source with a read() method that returns frames
             should_mirror: Whether to mirror the frames horizontally
         """
-        super(VideoRecorder, self).__init__()
+        super(VideoRecorder, self).__init__(name='video-recorder')
         self.daemon = True
         self.should_mirror = should_mirror
         self.stopped = False
@@ -38,13 +49,19 @@ class VideoRecorder(Thread):
         self._start_time = None
         self._frames_elapsed = 0
         self._fps_estimate = None
+        self._last_sequence = None
     
     def run(self):
         """Main thread function that captures frames and handles recording."""
         while not self.stopped:
+            sequence = getattr(self._source, 'sequence', None)
+            if sequence is not None and sequence == self._last_sequence:
+                time.sleep(self.POLL_INTERVAL)
+                continue
             frame = self._source.read()
             if frame is None:
                 continue
+            self._last_sequence = sequence
 
             # Update the FPS estimate
             if self._frames_elapsed == 0:
@@ -52,21 +69,30 @@ class VideoRecorder(Thread):
             else:
                 time_elapsed = time.time() - self._start_time
                 self._fps_estimate = self._frames_elapsed / time_elapsed
+                RECORDER_FPS.set(self._fps_estimate)
             self._frames_elapsed += 1
 
             # Write to the image file, if requested
             if self.is_writing_image:
                 image_path = self._image_filename
-                cv2.imwrite(image_path, frame)
+                with metrics.stage('record', frame):
+                    cv2.imwrite(image_path, frame)
                 self._image_filename = None
                 logging.info(f"Screenshot saved to {image_path}")
 
             # Write to the video file, if recording
-            self._write_video_frame(frame)
+            if self.is_writing_video:
+                with metrics.stage('record', frame):
+                    self._write_video_frame(frame)
+                metrics.observe_frame_age('recorder', getattr(frame, 'capture_time', None))
 
-            # Save the frame for external access
+            # Save the frame for external access, handing the one it
+            # replaces back to sources that pool their frames
             with self._frame_lock:
-                self._frame = frame
+                previous, self._frame = self._frame, frame
+            release = getattr(self._source, 'release', None)
+            if release is not None and previous is not None:
+                release(previous)
 
     @property
     def frame(self):
@@ -162,3 +188,4 @@ class VideoRecorder(Thread):
                 fps, size)
 
         self._video_writer.write(frame)
+        FRAMES_RECORDED.inc()
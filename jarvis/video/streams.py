@@ -2,20 +2,49 @@
 
 
 import time
-from io import BytesIO
-from threading import Thread
+from threading import Lock, Thread
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 
 import cv2
-import numpy
-from PIL import Image
+
+from jarvis.utils import metrics
+from jarvis.video.frame_pool import Frame, FramePool
+
+
+FRAMES_CAPTURED = metrics.counter('jarvis_frames_captured_total', "Frames grabbed from the camera")
+FRAMES_ENCODED = metrics.counter('jarvis_stream_frames_encoded_total',
+                                 "Frames JPEG-encoded for a web stream", ['stream'])
+STREAM_CLIENTS = metrics.gauge('jarvis_stream_clients',
+                               "Clients receiving a web stream", ['stream'])
+BYTES_SENT = metrics.counter('jarvis_stream_bytes_sent_total',
+                             "JPEG bytes sent to a web stream's clients", ['stream'])
+CLIENT_FRAMES_SENT = metrics.counter('jarvis_stream_client_frames_sent_total',
+                                     "Frames sent to a connected client", ['stream', 'client'])
+CLIENT_BYTES_SENT = metrics.counter('jarvis_stream_client_bytes_sent_total',
+                                    "JPEG bytes sent to a connected client", ['stream', 'client'])
+CLIENT_FRAMES_SKIPPED = metrics.counter(
+    'jarvis_stream_client_frames_skipped_total',
+    "Frames a connected client missed because it was still receiving an earlier one",
+    ['stream', 'client'])
 
 
 class DummyStream:
-    def __init__(self):
+    """A stream whose frames are set by the application.
+
+    Whatever uses the stream's frames registers a consumer: a callable that
+    returns whether it currently wants frames. The producer checks
+    has_consumers and skips the work of producing frames nobody will see.
+
+    Given a FramePool, the stream holds a reference to each pooled frame
+    while it is the current one, so the producer can release its own.
+    """
+    def __init__(self, frame_pool=None):
         self.stopped = False
+        self.sequence = 0
+        self.frame_pool = frame_pool
         self._frame = None
+        self._consumers = []
 
     @property
     def frame(self):
@@ -23,7 +52,22 @@ class DummyStream:
 
     @frame.setter
     def frame(self, frame):
+        pool = self.frame_pool
+        if pool is not None and frame is not None and pool.owns(frame):
+            pool.retain(frame)
+        previous = self._frame
         self._frame = frame
+        self.sequence += 1
+        if pool is not None and previous is not None and pool.owns(previous):
+            pool.release(previous)
+
+    def add_consumer(self, is_consuming):
+        """Register a callable that returns True while it wants frames."""
+        self._consumers.append(is_consuming)
+
+    @property
+    def has_consumers(self):
+        return any(is_consuming() for is_consuming in self._consumers)
 
     def read(self):
         return self.frame
@@ -36,56 +80,115 @@ class DummyStream:
 
 
 class WebcamVideoStream:
-    def __init__(self, device=0, should_mirror=False):
+    """Grabs frames from a camera on a background thread.
+
+    Frames are captured into, and mirrored into, buffers leased from a
+    FramePool, and carry the time they were captured. A reader that hands
+    each frame back with release() once done with it lets the buffer be
+    reused; frames that aren't handed back are left to the garbage
+    collector.
+    """
+    def __init__(self, device=0, should_mirror=False, frame_pool=None):
         self.should_mirror = should_mirror
         self.stopped = False
         self.grabbed = False
+        self.sequence = 0
+        self.frame_pool = frame_pool if frame_pool is not None else FramePool()
         self._frame = None
+        self._frame_lock = Lock()
         self._stream = cv2.VideoCapture(device)
 
     def read(self):
-        if self.should_mirror and self._frame is not None:
-            return numpy.fliplr(self._frame).copy()
-        else:
-            return self._frame
+        return self.read_new(None)[1]
+
+    def read_new(self, last_sequence):
+        """
+        Return (sequence, frame) for the current frame, with frame None if
+        there is none or its sequence is still last_sequence. Both are read
+        together, so a frame is never mistaken for the next one and
+        processed twice. Hand the frame back with release(), as for read().
+        """
+        with self._frame_lock:
+            sequence = self.sequence
+            frame = self._frame
+            if frame is None or sequence == last_sequence:
+                return sequence, None
+            if not self.should_mirror:
+                if self.frame_pool.owns(frame):
+                    self.frame_pool.retain(frame)
+                return sequence, frame
+        with metrics.stage('mirror', frame):
+            mirrored = self.frame_pool.lease_like(frame)
+            cv2.flip(frame, 1, mirrored)
+        return sequence, mirrored
+
+    def release(self, frame):
+        """Hand back a frame returned by read()."""
+        if frame is not None and self.frame_pool.owns(frame):
+            self.frame_pool.release(frame)
             
     def get(self, propId):
         """Get a property from the underlying VideoCapture object."""
         return self._stream.get(propId)
 
     def start(self):
-        t = Thread(target=self.update, args=())
+        t = Thread(target=self.update, args=(), name='camera-capture')
         t.daemon = True
         t.start()
         return self
 
     def update(self):
         while not self.stopped:
-            self.grabbed, self._frame = self._stream.read()
+            # Capture into a pooled buffer shaped like the last frame; the
+            # first frame (or one of a new size) is allocated by OpenCV
+            previous = self._frame
+            buffer = self.frame_pool.lease_like(previous) if previous is not None else None
+            # Includes waiting for the camera's next frame
+            start = time.perf_counter()
+            self.grabbed, frame = self._stream.read(buffer)
+            end = time.perf_counter()
+            if not self.grabbed:
+                frame = None
+            else:
+                if not isinstance(frame, Frame):
+                    frame = frame.view(Frame)
+                frame.capture_time = end
+                metrics.record_stage('capture', start, end, end)
+                FRAMES_CAPTURED.inc()
+            if buffer is not None and frame is not buffer:
+                self.frame_pool.release(buffer)
+            with self._frame_lock:
+                self._frame = frame
+                self.sequence += 1
+            self.release(previous)
 
     def stop(self):
         self.stopped = True
 
 
 class WebRequestHandler(BaseHTTPRequestHandler):
+    # How long to wait before checking again for a new frame
+    POLL_INTERVAL = 0.005
+
     def do_GET(self):
-        if self.path.endswith('.mjpg'):
+        if self.path == '/metrics':
+            data = metrics.REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self.path.endswith('.mjpg'):
             self.send_response(200)
             self.send_header('Content-type','multipart/x-mixed-replace; boundary=--jpgboundary')
             self.end_headers()
-            while not self.server.stopped:
-                frame = self.server.camera_feed.read()
-                if frame is None:
-                    continue
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                image = Image.fromarray(image)
-                s = BytesIO()
-                image.save(s, 'JPEG')
-                self.wfile.write(b'--jpgboundary')
-                self.send_header('Content-type', 'image/jpeg')
-                self.send_header('Content-length', str(s.getbuffer().nbytes))
-                self.end_headers()
-                image.save(self.wfile, 'JPEG')
+            self.server.add_subscriber(1)
+            try:
+                self._stream_frames()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client went away
+            finally:
+                self.server.add_subscriber(-1)
         else:
             self.send_response(200)
             self.send_header('Content-type', 'text/html')
@@ -94,16 +197,106 @@ class WebRequestHandler(BaseHTTPRequestHandler):
             self.wfile.write(b'<img src="/stream.mjpg"/>')
             self.wfile.write(b'</body></html>')
 
+    def _stream_frames(self):
+        """Send each new frame of the feed as one part of the MJPEG stream."""
+        stream = self.server.name
+        client = '{}:{}'.format(*self.client_address[:2])
+        frames_sent = CLIENT_FRAMES_SENT.labels(stream, client)
+        bytes_sent = CLIENT_BYTES_SENT.labels(stream, client)
+        frames_skipped = CLIENT_FRAMES_SKIPPED.labels(stream, client)
+        stream_bytes_sent = BYTES_SENT.labels(stream)
+        last_sequence = None
+        try:
+            while not self.server.stopped:
+                sequence, jpeg, capture_time = self.server.latest_jpeg()
+                if jpeg is None or sequence == last_sequence:
+                    time.sleep(self.POLL_INTERVAL)
+                    continue
+                if last_sequence is not None and sequence > last_sequence + 1:
+                    frames_skipped.inc(sequence - last_sequence - 1)
+                last_sequence = sequence
+                start = time.perf_counter()
+                self.wfile.write(b'--jpgboundary')
+                self.send_header('Content-type', 'image/jpeg')
+                self.send_header('Content-length', str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+                metrics.record_stage('write', start, time.perf_counter(), capture_time)
+                metrics.observe_frame_age('stream', capture_time)
+                frames_sent.inc()
+                bytes_sent.inc(len(jpeg))
+                stream_bytes_sent.inc(len(jpeg))
+        finally:
+            # Per-client series only live as long as the connection
+            for metric in (CLIENT_FRAMES_SENT, CLIENT_BYTES_SENT, CLIENT_FRAMES_SKIPPED):
+                metric.remove(stream, client)
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    """Serves a camera feed as MJPEG to any number of clients.
+
+    Each frame is JPEG-encoded once, however many clients are watching, and
+    only when it is new (feeds with a sequence counter) - so an idle feed
+    or one without clients costs nothing to serve.
+    """
+    daemon_threads = True
+    JPEG_QUALITY = 75
+
+    def __init__(self, server_address, handler_class, camera_feed, name=None):
+        HTTPServer.__init__(self, server_address, handler_class)
+        self.camera_feed = camera_feed
+        # Identifies the stream in metrics
+        self.name = name or str(server_address[1])
+        self.stopped = True
+        self.subscriber_count = 0
+        self._lock = Lock()
+        self._jpeg = None
+        self._jpeg_sequence = None
+        self._jpeg_capture_time = None
+
+    def add_subscriber(self, delta):
+        with self._lock:
+            self.subscriber_count += delta
+            STREAM_CLIENTS.labels(self.name).set(self.subscriber_count)
+
+    def latest_jpeg(self):
+        """Return (sequence, JPEG bytes, capture time) for the feed's current frame.
+
+        Feeds without a sequence counter are re-encoded on every call, and
+        get a new sequence each time.
+        """
+        with self._lock:
+            sequence = getattr(self.camera_feed, 'sequence', None)
+            if sequence is not None and sequence == self._jpeg_sequence:
+                return sequence, self._jpeg, self._jpeg_capture_time
+            frame = self.camera_feed.read()
+            if frame is None:
+                return sequence, None, None
+            capture_time = getattr(frame, 'capture_time', None)
+            with metrics.stage('encode', frame):
+                ok, jpeg = cv2.imencode('.jpg', frame,
+                                        [cv2.IMWRITE_JPEG_QUALITY, self.JPEG_QUALITY])
+            release = getattr(self.camera_feed, 'release', None)
+            if release is not None:
+                release(frame)
+            if not ok:
+                return sequence, None, None
+            FRAMES_ENCODED.labels(self.name).inc()
+            if sequence is None:
+                sequence = (self._jpeg_sequence or 0) + 1
+            self._jpeg = jpeg.tobytes()
+            self._jpeg_sequence = sequence
+            self._jpeg_capture_time = capture_time
+            return sequence, self._jpeg, capture_time
+
 
 class ThreadedWebStream(Thread):
-    def __init__(self, camera_feed, ip='127.0.0.1', port=8000):
-        class ThreadedHTTPServer(ThreadingMixIn, HTTPServer): pass
-        super(ThreadedWebStream, self).__init__()
+    """Serves a camera feed as MJPEG, and the process's metrics on /metrics."""
+    def __init__(self, camera_feed, ip='127.0.0.1', port=8000, name=None):
+        super(ThreadedWebStream, self).__init__(name=f"web-stream-{name or port}")
         self.ip = ip
         self.port = port
-        self.server = ThreadedHTTPServer((ip, port), WebRequestHandler)
-        self.server.camera_feed = camera_feed
-        self.server.stopped = True
+        self.server = ThreadedHTTPServer((ip, port), WebRequestHandler, camera_feed, name)
 
     def run(self):
         self.server.stopped = False
@@ -113,5 +306,10 @@ class ThreadedWebStream(Thread):
         self.server.stopped = True
         self.server.shutdown()
 
+    @property
+    def subscriber_count(self):
+        """The number of clients currently receiving the MJPEG stream."""
+        return self.server.subscriber_count
+
     def __str__(self):
         return "{}:{}".format(self.ip, self.port)
\ No newline at end of file
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark every image filter across frame resolutions.
+
+    python scripts/benchmark_filters.py
+    python scripts/benchmark_filters.py --resolutions 1080p 4k --image photo.jpg
+    python scripts/benchmark_filters.py --json results.json
+    python scripts/benchmark_filters.py --baseline results.json --threshold 0.15
+
+Each filter from filters.create_default_filters() is applied to synthetic
+frames (and to any --image, scaled to each resolution) and the latency of
+each call is recorded. The report gives the mean, median and 99th
+percentile latency, the resulting frames per second and the peak bytes
+allocated while filtering one frame. Allocations are measured with
+tracemalloc in a separate pass, so they only cover memory allocated
+through Python and NumPy (including arrays OpenCV returns), not OpenCV's
+internal temporaries.
+
+With --baseline the results are compared with a previous --json file, and
+the exit status is 1 if any filter's median latency grew by more than the
+threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from jarvis.utils import filters
+from jarvis.utils.tiling import TileExecutor
+
+
+RESOLUTIONS = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+# Intensities every filter is measured at, and the extra ones for the edge
+# filter, whose kernel sizes (and so its cost) grow with intensity
+DEFAULT_INTENSITIES = [filters.DEFAULT_INTENSITY]
+EDGE_INTENSITIES = [10, 30, 50, 70, 90]
+
+
+def synthetic_frame(width, height, seed=0):
+    """Return a BGR frame with gradients, shapes and sensor-like noise."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[..., 0] = 255 * x * (1 - y)
+    frame[..., 1] = 255 * y
+    frame[..., 2] = 255 * (1 - x) * (0.5 + 0.5 * y)
+    scale = min(width, height)
+    for _ in range(24):
+        centre = (int(rng.integers(width)), int(rng.integers(height)))
+        colour = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(frame, centre, int(rng.integers(scale // 40, scale // 6)),
+                   colour, -1, cv2.LINE_AA)
+    noise = rng.normal(0, 6, frame.shape).astype(np.int16)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def load_frames(resolution_names, image_paths):
+    """Return a list of (source, resolution, frame) to benchmark on."""
+    images = []
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            raise SystemExit(f"Could not read image {path}")
+        images.append((os.path.basename(path), image))
+
+    frames = []
+    for name in resolution_names:
+        width, height = RESOLUTIONS[name]
+        frames.append(('synthetic', name, synthetic_frame(width, height)))
+        for source, image in images:
+            frames.append((source, name, cv2.resize(image, (width, height),
+                                                    interpolation=cv2.INTER_AREA)))
+    return frames
+
+
+def benchmark_cases():
+    """Return a list of (filter_id, intensity, filter) to measure."""
+    cases = []
+    for filter_id, filter_obj in filters.create_default_filters().items():
+        if filter_obj is None:
+            continue
+        intensities = EDGE_INTENSITIES if filter_id == 'edges' else DEFAULT_INTENSITIES
+        for intensity in intensities:
+            cases.append((filter_id, intensity, filter_obj.with_intensity(intensity)))
+    return cases
+
+
+def measure(apply, src, dst, iterations, warmup):
+    """Return the latencies (in seconds) and peak allocation of apply()."""
+    for _ in range(warmup):
+        apply(src, dst)
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        apply(src, dst)
+        latencies.append(time.perf_counter() - start)
+
+    # Allocations are measured separately as tracing slows every allocation
+    tracemalloc.start()
+    peak_bytes = 0
+    for _ in range(min(iterations, 3)):
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        apply(src, dst)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes = max(peak_bytes, peak - baseline)
+    tracemalloc.stop()
+    return latencies, peak_bytes
+
+
+def run(frames, cases, iterations, warmup, executor=None):
+    """Benchmark every case on every frame and return the result dicts."""
+    results = []
+    for source, resolution, frame in frames:
+        height, width = frame.shape[:2]
+        dst = np.empty_like(frame)
+        for filter_id, intensity, filter_obj in cases:
+            if executor is None:
+                apply = filter_obj.apply
+            else:
+                def apply(src, dst, filter_obj=filter_obj):
+                    executor.apply(filter_obj, src, dst)
+            latencies, peak_bytes = measure(apply, frame, dst, iterations, warmup)
+            latencies_ms = np.array(latencies) * 1000.0
+            mean_ms = float(latencies_ms.mean())
+            results.append({
+                'filter': filter_id,
+                'intensity': intensity,
+                'source': source,
+                'resolution': resolution,
+                'width': width,
+                'height': height,
+                'iterations': iterations,
+                'mean_ms': mean_ms,
+                'p50_ms': float(np.percentile(latencies_ms, 50)),
+                'p99_ms': float(np.percentile(latencies_ms, 99)),
+                'fps': 1000.0 / mean_ms if mean_ms > 0 else float('inf'),
+                'alloc_bytes': int(peak_bytes),
+            })
+    return results
+
+
+def result_key(result):
+    return (result['filter'], result['intensity'], result['source'],
+            result['resolution'])
+
+
+def format_table(results, baseline=None):
+    """Return the results as a fixed-width text table."""
+    baseline_p50 = {result_key(result): result['p50_ms']
+                    for result in (baseline or [])}
+    header = (f"{'filter':<14}{'int':>4} {'source':<12}{'res':>6}"
+              f"{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'fps':>9}{'alloc KiB':>11}")
+    if baseline is not None:
+        header += f"{'vs base':>9}"
+    lines = [header, '-' * len(header)]
+    for result in results:
+        line = (f"{result['filter']:<14}{result['intensity']:>4} "
+                f"{result['source'][:11]:<12}{result['resolution']:>6}"
+                f"{result['mean_ms']:>10.2f}{result['p50_ms']:>10.2f}"
+                f"{result['p99_ms']:>10.2f}{result['fps']:>9.1f}"
+                f"{result['alloc_bytes'] / 1024.0:>11.1f}")
+        if baseline is not None:
+            previous = baseline_p50.get(result_key(result))
+            if previous:
+                line += f"{(result['p50_ms'] / previous - 1) * 100:>+8.1f}%"
+            else:
+                line += f"{'new':>9}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def find_regressions(results, baseline, threshold):
+    """Return the results whose median latency grew by more than threshold."""
+    baseline_p50 = {result_key(result): result['p50_ms'] for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_p50.get(result_key(result))
+        if previous and result['p50_ms'] > previous * (1 + threshold):
+            regressions.append((result, previous))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--resolutions', nargs='+', choices=sorted(RESOLUTIONS),
+                        default=['480p', '720p', '1080p', '4k'],
+                        help='Frame sizes to benchmark (default: all)')
+    parser.add_argument('--image', action='append', default=[],
+                        help='Sample image to benchmark on as well as the '
+                             'synthetic frames (may be repeated)')
+    parser.add_argument('--filter', action='append', default=[],
+                        help='Only benchmark this filter ID (may be repeated)')
+    parser.add_argument('--iterations', type=int, default=30,
+                        help='Timed runs per filter and frame (default: 30)')
+    parser.add_argument('--warmup', type=int, default=3,
+                        help='Untimed runs before timing (default: 3)')
+    parser.add_argument('--tiled', action='store_true',
+                        help='Apply filters through the TileExecutor, as Jarvis does')
+    parser.add_argument('--json', metavar='PATH',
+                        help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='JSON file from a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed median latency growth over the baseline, '
+                             'as a fraction (default: 0.10)')
+    args = parser.parse_args()
+
+    cases = benchmark_cases()
+    if args.filter:
+        cases = [case for case in cases if case[0] in args.filter]
+    frames = load_frames(args.resolutions, args.image)
+    executor = TileExecutor() if args.tiled else None
+    try:
+        results = run(frames, cases, args.iterations, args.warmup, executor)
+    finally:
+        if executor is not None:
+            executor.close()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+    print(format_table(results, baseline))
+
+    if args.json:
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+            'tiled': args.tiled,
+            'results': results,
+        }
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+        print(f"Results written to {args.json}")
+
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.threshold)
+        for result, previous in regressions:
+            print(f"REGRESSION: {result['filter']} at intensity {result['intensity']}, "
+                  f"{result['source']} {result['resolution']}: "
+                  f"{previous:.2f} ms -> {result['p50_ms']:.2f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
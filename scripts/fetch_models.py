@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+"""
+Download the DNN model files Jarvis uses, for use offline.
+
+    python scripts/fetch_models.py                  # every model, into the cache
+    python scripts/fetch_models.py sface --dir /srv/models
+    python scripts/fetch_models.py --dir models --trust-existing
+
+Files are written to the Jarvis cache directory (or --dir) and their
+SHA-256 checksums recorded beside them, so later loads can be verified.
+Copy the directory to an offline host and point JARVIS_MODEL_PATH at it.
+Files already there are verified; --trust-existing records the checksums
+of those that have none, e.g. ones fetched before checksums were recorded.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jarvis.face import models
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help='Models to fetch: {} (default: all)'.format(
+                            ', '.join(sorted(models.MODELS))))
+    parser.add_argument('--dir', help='Directory to put the files in')
+    parser.add_argument('--trust-existing', action='store_true',
+                        help='Record the checksums of files already in the '
+                             'directory that have none')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in models.MODELS]
+    if unknown:
+        parser.error('unknown model: ' + ', '.join(unknown))
+
+    for name in args.names or sorted(models.MODELS):
+        for path in models.fetch(name, args.dir, args.trust_existing):
+            print(f"{name}: {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
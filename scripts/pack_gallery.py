@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+"""
+Pack a face training data directory into a single gallery file.
+
+    python scripts/pack_gallery.py training/data faces.gallery
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jarvis.face.face_recognition import FaceRecognizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('training_data_path',
+                        help='Directory with one subdirectory of images per subject')
+    parser.add_argument('gallery_path', help='Gallery file to write')
+    args = parser.parse_args()
+
+    recognizer = FaceRecognizer()
+    count = recognizer.pack_gallery(args.training_data_path, args.gallery_path)
+    return 0 if count > 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())